@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+
+# Compares merging release manifests with parse-manifest.py against the
+# quadratic merge it replaced, and against reading the merged result
+# from its cache. The manifests are synthetic: a release manifest with
+# the given number of entries in each package list, and a develop and a
+# user manifest which each override a tenth of them and add a few more.
+#
+# Usage: benchmarks/manifest_merge_benchmark.py [-n <entries per list>] [-r <repetitions>]
+
+import argparse
+import copy
+import importlib.util
+import os
+import sys
+import tempfile
+import time
+
+import yaml
+
+SCRIPTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts")
+sys.path.insert(0, SCRIPTS_DIR)
+spec = importlib.util.spec_from_file_location("parse_manifest", os.path.join(SCRIPTS_DIR, "parse-manifest.py"))
+parse_manifest = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(parse_manifest)
+
+LISTS = ["external_deps", "src_pkgs", "prebuilt_pkgs"]
+
+
+def legacy_merge_dict(y1, y2):
+    "The implementation of merge_dict prior to the ordered-dict merge"
+    for key, value in y2.items():
+        if key in y1:
+            if value is None:
+                continue
+            elif type(value) is dict:
+                legacy_merge_dict(y1[key], y2[key])
+            elif type(value) is list:
+                y1[key].extend(y2[key])
+            else:
+                y1[key] = y2[key]
+        else:
+            y1[key] = y2[key]
+    return
+
+
+def legacy_merge_dict_list(listd):
+    "The implementation of merge_dict_list prior to the ordered-dict merge"
+    if listd is None:
+        return
+    tags = list(listd[0].keys())
+    mlistd = [[] for x in tags]
+    for i in listd:
+        if i[tags[0]] not in mlistd[0]:
+            for j in range(len(tags)):
+                mlistd[j].append(i[tags[j]])
+        else:
+            idx = mlistd[0].index(i[tags[0]])
+            for j in range(1, len(tags)):
+                mlistd[j][idx] = i[tags[j]]
+    listd = [ {tags[k]:mlistd[k][i] for k in range(len(tags))} \
+        for i in range(len(mlistd[0])) ]
+    return listd
+
+
+def legacy_merge_manifest_files(fnames):
+    fman = {}
+    for i in fnames:
+        legacy_merge_dict(fman, parse_manifest.parse_manifest_file(i))
+    for i in LISTS:
+        fman[i] = legacy_merge_dict_list(fman[i])
+    return fman
+
+
+def entry(lst, n, version):
+    if lst == "src_pkgs":
+        return {"name": f"pkg{n}", "repo": f"https://github.com/DUNE-DAQ/pkg{n}.git", "tag": version}
+    return {"name": f"{lst}{n}", "version": version, "variant": None if n % 2 else "e20:prof"}
+
+
+def write_manifests(tmpdir, num_entries):
+    manifests = {
+        "release": {"product_paths": ["/cvmfs/products"],
+                    **{lst: [entry(lst, n, "v1_0_0") for n in range(num_entries)] for lst in LISTS}},
+        "develop": {lst: [entry(lst, n, "v1_1_0") for n in range(0, num_entries, 10)] +
+                         [entry(lst, n, "v0_1_0") for n in range(num_entries, num_entries + 20)] for lst in LISTS},
+        "user": {lst: [entry(lst, n, "v2_0_0") for n in range(5, num_entries, 10)] +
+                      [entry(lst, n, "v0_2_0") for n in range(num_entries + 10, num_entries + 30)] for lst in LISTS},
+    }
+    fnames = []
+    for name, manifest in manifests.items():
+        fname = os.path.join(tmpdir, f"{name}.yaml")
+        with open(fname, "w") as f:
+            yaml.safe_dump(manifest, f, sort_keys=False)
+        fnames.append(fname)
+    return fnames
+
+
+def best_time(func, repetitions, setup=None):
+    times = []
+    for _ in range(repetitions):
+        if setup:
+            setup()
+        starttime = time.monotonic()
+        result = func()
+        times.append(time.monotonic() - starttime)
+    return min(times), result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark merging release manifests")
+    parser.add_argument("-n", "--entries", type=int, default=5000, help="entries in each package list of the release manifest")
+    parser.add_argument("-r", "--repetitions", type=int, default=3, help="how many times to run each merge; the best time is reported")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        fnames = write_manifests(tmpdir, args.entries)
+        cache_dir = os.path.join(tmpdir, "cache")
+
+        # The YAML parsing is the same either way, so only the merging is
+        # timed, on fresh copies of the parsed documents made beforehand
+        documents = dict((fname, parse_manifest.parse_manifest_file(fname)) for fname in fnames)
+        copies = {}
+        def make_copies():
+            copies.update((fname, copy.deepcopy(document)) for fname, document in documents.items())
+        original_parse = parse_manifest.parse_manifest_file
+        parse_manifest.parse_manifest_file = lambda fname: copies.pop(fname)
+
+        legacy_time, legacy_result = best_time(lambda: legacy_merge_manifest_files(fnames), args.repetitions, make_copies)
+        new_time, new_result = best_time(lambda: parse_manifest.merge_manifest_files(fnames), args.repetitions, make_copies)
+
+        if legacy_result != new_result:
+            sys.exit("ERROR: the merged manifests differ")
+
+        parse_manifest.parse_manifest_file = original_parse
+        uncached_time, _ = best_time(lambda: parse_manifest.merge_manifest_files(fnames), args.repetitions)
+        parse_manifest.merge_manifest_files(fnames, cache_dir=cache_dir)
+        cached_time, cached_result = best_time(lambda: parse_manifest.merge_manifest_files(fnames, cache_dir=cache_dir), args.repetitions)
+
+        if cached_result != new_result:
+            sys.exit("ERROR: the cached manifest differs")
+
+    print(f"{args.entries} entries per package list, {len(fnames)} manifests, best of {args.repetitions}:")
+    print(f"    legacy merge:         {legacy_time:8.3f} s")
+    print(f"    ordered-dict merge:   {new_time:8.3f} s")
+    print(f"    parse and merge:      {uncached_time:8.3f} s")
+    print(f"    from the cache:       {cached_time:8.3f} s")
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+
+# Compares the throughput of pytee.run with the line-by-line pexpect
+# loop it replaced, by running a command which prints a large amount
+# of compiler-like output through each of them. The command's output
+# is sent to /dev/null rather than the terminal so that what's measured
+# is the tee itself.
+#
+# Usage: benchmarks/pytee_benchmark.py [-m <megabytes of output>] [-r <repetitions>]
+
+import argparse
+import contextlib
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import pexpect
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts"))
+import pytee
+
+
+def legacy_run(cmd, args, log):
+    "The implementation of pytee.run prior to the buffered tee engine"
+
+    logfile = None
+    if log:
+        logfile = open(log, 'a')
+
+    cols, rows = shutil.get_terminal_size(fallback=(400, 100))
+
+    process = pexpect.spawn(
+        f'{cmd} {" ".join(args)}',
+        dimensions=(rows, cols)
+    )
+
+    patterns = process.compile_pattern_list([
+            '\r\n',
+            '\r',
+            pexpect.TIMEOUT,
+            pexpect.EOF,
+        ])
+
+    while True:
+        index = process.expect (patterns, timeout=60)
+
+        if index == 0:
+            text=process.before.decode('utf-8')
+            print(text,flush=True)
+            if log:
+                print(text, file=logfile)
+        elif index == 1:
+            if not process.before:
+                continue
+            text=process.before.decode('utf-8')
+            print(text,flush=True)
+            if log:
+                print(text, file=logfile)
+        elif index == 2:
+            print('<pytee: 60 sec elapsed without new input>')
+            continue
+        else:
+            break
+    process.close()
+
+    if logfile:
+        logfile.close()
+
+    return process.exitstatus
+
+
+GENERATOR = """
+import sys
+line = ("[%d/%d] /usr/bin/g++ -DBOOST_ALL_DYN_LINK -I/some/include/dir -O2 -g -std=c++17 "
+        "-MD -MT pkg/CMakeFiles/pkg.dir/src/File.cpp.o -c /work/sourcecode/pkg/src/File.cpp\\n")
+out = sys.stdout.buffer
+total = int(sys.argv[1])
+written = 0
+i = 0
+while written < total:
+    text = (line % (i, i + 1)).encode()
+    out.write(text)
+    written += len(text)
+    i += 1
+"""
+
+
+@contextlib.contextmanager
+def stdout_to_devnull():
+    sys.stdout.flush()
+    saved_fd = os.dup(1)
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    os.dup2(devnull, 1)
+    try:
+        yield
+    finally:
+        sys.stdout.flush()
+        os.dup2(saved_fd, 1)
+        os.close(saved_fd)
+        os.close(devnull)
+
+
+def time_run(run, generator, nbytes, log):
+    with stdout_to_devnull():
+        starttime = time.monotonic()
+        retval = run(sys.executable, [generator, str(nbytes)], log)
+        elapsed = time.monotonic() - starttime
+    assert retval == 0, f"benchmark command returned {retval}"
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark pytee.run against the line-by-line implementation it replaced")
+    parser.add_argument("-m", "--megabytes", type=float, default=50, help="amount of output the benchmark command produces")
+    parser.add_argument("-r", "--repetitions", type=int, default=3, help="number of runs of each implementation; the fastest is reported")
+    args = parser.parse_args()
+
+    nbytes = int(args.megabytes * 1024 * 1024)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        generator = os.path.join(tmpdir, "generate_output.py")
+        with open(generator, "w") as f:
+            f.write(GENERATOR)
+
+        results = {}
+        for label, run in [("line-by-line (legacy)", legacy_run), ("buffered (current)", pytee.run)]:
+            times = []
+            for i in range(args.repetitions):
+                log = os.path.join(tmpdir, "build.log")
+                times.append(time_run(run, generator, nbytes, log))
+                os.unlink(log)
+            results[label] = min(times)
+
+    print(f"Teeing {args.megabytes:g} MB of output, best of {args.repetitions} runs:")
+    for label, elapsed in results.items():
+        print(f"  {label:<25} {elapsed:8.2f} s  {args.megabytes / elapsed:8.1f} MB/s")
+
+    legacy, current = results.values()
+    print(f"  speedup: {legacy / current:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
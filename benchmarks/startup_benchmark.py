@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+
+# Measures how long dbt-build and dbt-info take to start up, by timing
+# "dbt-build --help", a build in which there's nothing to do and
+# "dbt-info release" in a fake work area. Stand-ins for spack, cmake and
+# dbt-workarea-env.sh are put on the PATH, so no release or compiler is
+# needed and what's measured is the scripts' own overhead.
+#
+# A cold run is one without any of daq-buildtools' compiled Python
+# modules or the work area's .dbt-cache, as after checking out a new
+# version or creating a new work area; warm runs are the ones after it.
+# The scripts are run from a copy of bin/ and scripts/ so that the
+# checkout's own __pycache__ directories are left alone.
+#
+# Usage: benchmarks/startup_benchmark.py [-p <packages>] [-r <repetitions>] [--dbt-root <daq-buildtools checkout>]
+
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+RELEASE = "fddaq-v5.0.0"
+BASE_RELEASE = "coredaq-v5.0.0"
+
+FAKE_SPACK = """#!/bin/bash
+# Only "spack location -p <package>" is supported
+[[ $1 == location ]] || exit 1
+package=${!#}
+case $package in
+    coredaq) echo %(releases)s/%(base_release)s/spack/coredaq ;;
+    fddaq)   echo %(releases)s/%(release)s/spack/fddaq ;;
+    *) echo "==> Error: Spec '$package' matches no installed packages." >&2; exit 1 ;;
+esac
+"""
+
+FAKE_CMAKE = """#!/bin/bash
+# Behaves like a build in which everything is up to date
+echo "ninja: no work to do."
+"""
+
+
+def write_file(path, contents, executable=False):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.write(contents)
+    if executable:
+        os.chmod(path, 0o755)
+
+
+def make_fake_setup(tmpdir, dbt_root, num_packages):
+    "Create a work area, a release and the fake tools, and return the environment to run the scripts in"
+
+    dbt_copy = os.path.join(tmpdir, "daq-buildtools")
+    for subdir in ["bin", "scripts"]:
+        shutil.copytree(os.path.join(dbt_root, subdir), os.path.join(dbt_copy, subdir),
+                        ignore=shutil.ignore_patterns("__pycache__"))
+
+    area = os.path.join(tmpdir, "workarea")
+    write_file(os.path.join(area, "dbt-workarea-constants.sh"),
+               f"export SPACK_RELEASE=\"{RELEASE}\"\nexport SPACK_RELEASES_DIR=\"{tmpdir}/releases\"\nexport DBT_ROOT_WHEN_CREATED=\"{dbt_copy}\"\n")
+    for n in range(num_packages):
+        pkg = f"package{n}"
+        write_file(os.path.join(area, "sourcecode", pkg, "CMakeLists.txt"), f"project({pkg})\n")
+        os.makedirs(os.path.join(area, "build", pkg, "unittest"))
+        write_file(os.path.join(area, "install", pkg, f"{pkg}_build_info.json"), f'{{"package": "{pkg}"}}\n')
+    write_file(os.path.join(area, "build", "CMakeCache.txt"), "CMAKE_GENERATOR:INTERNAL=Ninja\n")
+    os.makedirs(os.path.join(area, "build", "CMakeFiles"))
+    os.makedirs(os.path.join(area, "log"))
+    write_file(os.path.join(area, ".venv", "pyvenv.cfg"), "")
+
+    releases = os.path.join(tmpdir, "releases")
+    for release, package in [(BASE_RELEASE, "coredaq"), (RELEASE, "fddaq")]:
+        os.makedirs(os.path.join(releases, release, "spack", package))
+        write_file(os.path.join(releases, release, f"{release}.yaml"), f"release: {release}\ntype: frozen\n")
+
+    fakebin = os.path.join(tmpdir, "fakebin")
+    write_file(os.path.join(fakebin, "spack"), FAKE_SPACK % {"releases": releases, "release": RELEASE, "base_release": BASE_RELEASE},
+               executable=True)
+    write_file(os.path.join(fakebin, "cmake"), FAKE_CMAKE, executable=True)
+    write_file(os.path.join(fakebin, "dbt-workarea-env.sh"), "", executable=True)
+
+    env = dict(os.environ)
+    env.update({"DBT_ROOT": dbt_copy,
+                "DBT_AREA_ROOT": area,
+                "DBT_INSTALL_DIR": os.path.join(area, "install"),
+                "DBT_WORKAREA_ENV_SCRIPT_SOURCED": "1",
+                "VIRTUAL_ENV": os.path.join(area, ".venv"),
+                "SPACK_ROOT": os.path.join(tmpdir, "spack"),
+                "SPACK_RELEASE": RELEASE,
+                "SPACK_RELEASES_DIR": releases,
+                "PATH": f"{fakebin}:{os.path.join(dbt_copy, 'bin')}:{env['PATH']}",
+                "PWD": area})
+    for var in ["PYTHONDONTWRITEBYTECODE", "PYTHONPYCACHEPREFIX", "DBT_COMPILER_CACHE"]:
+        env.pop(var, None)
+    return dbt_copy, area, env
+
+
+def make_cold(dbt_copy, area):
+    for dirpath, dirnames, _ in os.walk(dbt_copy):
+        if "__pycache__" in dirnames:
+            shutil.rmtree(os.path.join(dirpath, "__pycache__"))
+            dirnames.remove("__pycache__")
+    shutil.rmtree(os.path.join(area, ".dbt-cache"), ignore_errors=True)
+
+
+def time_command(cmd, env, cwd):
+    starttime = time.monotonic()
+    proc = subprocess.run(cmd, env=env, cwd=cwd, stdin=subprocess.DEVNULL,
+                          stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    elapsed = time.monotonic() - starttime
+    if proc.returncode != 0:
+        sys.exit(f"ERROR: \"{' '.join(cmd)}\" returned {proc.returncode}:\n{proc.stderr.decode('utf-8', errors='replace')}")
+    return elapsed
+
+
+def best_time(cmd, env, cwd, repetitions, setup=None):
+    times = []
+    for _ in range(repetitions):
+        if setup:
+            setup()
+        times.append(time_command(cmd, env, cwd))
+    return min(times)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the startup time of dbt-build and dbt-info")
+    parser.add_argument("-p", "--packages", type=int, default=20, help="number of packages in the fake work area")
+    parser.add_argument("-r", "--repetitions", type=int, default=5, help="how many times to run each command; the best time is reported")
+    parser.add_argument("--dbt-root", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."),
+                        help="the daq-buildtools checkout to benchmark (default: this one)")
+    args = parser.parse_args()
+
+    commands = [("dbt-build --help", ["dbt-build", "--help"]),
+                ("no-op dbt-build", ["dbt-build"]),
+                ("dbt-info release", ["dbt-info", "release"])]
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmpdir:
+        dbt_copy, area, env = make_fake_setup(tmpdir, os.path.abspath(args.dbt_root), args.packages)
+        for label, cmd in commands:
+            cmd = [sys.executable, os.path.join(dbt_copy, "bin", cmd[0])] + cmd[1:]
+            cold_time = best_time(cmd, env, area, args.repetitions, lambda: make_cold(dbt_copy, area))
+            warm_time = best_time(cmd, env, area, args.repetitions)
+            results.append((label, cold_time, warm_time))
+
+    print(f"{args.packages} packages in the work area, best of {args.repetitions}:")
+    print(f"    {'':<22}{'cold':>10}{'warm':>10}")
+    for label, cold_time, warm_time in results:
+        print(f"    {label + ':':<22}{cold_time:8.3f} s{warm_time:8.3f} s")
@@ -1,6 +1,8 @@
 #!/usr/bin/env python
 from __future__ import with_statement
 
+import concurrent.futures
+import errno
 import logging
 import optparse
 import os
@@ -10,9 +12,19 @@ import shutil
 import subprocess
 import sys
 import itertools
-import shutil
-import fnmatch
 import tarfile
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
 
 
 __version__ = '0.5.7'
@@ -26,6 +38,21 @@ if sys.platform == 'win32':
     env_bin_dir = 'Scripts'
 
 
+# The Linux ioctl which makes a file share the extents of another, on
+# filesystems which support copy-on-write (btrfs, XFS, bcachefs, ...)
+FICLONE = 0x40049409
+
+# Copying from cvmfs or a network filesystem is mostly waiting on I/O,
+# so this is deliberately more threads than there are cores
+DEFAULT_COPY_JOBS = 16
+
+# How to recognize the compression of a venv tarball from its first bytes
+GZIP_MAGIC = b'\x1f\x8b'
+ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+
+pybinre = re.compile(r'pythonw?([0-9]+(\.[0-9]+(\.[0-9]+)?)?)?$')
+
+
 class UserError(Exception):
     pass
 
@@ -60,7 +87,7 @@ def _virtualenv_sys(venv_path):
         '-c', 'import sys;'
               'print ("%d.%d" % (sys.version_info.major, sys.version_info.minor));'
               'print ("\\n".join(sys.path));'],
-        env={"LD_LIBRARY_PATH": os.getenv('LD_LIBRARY_PATH')},
+        env={"LD_LIBRARY_PATH": os.getenv('LD_LIBRARY_PATH', '')},
         stdout=subprocess.PIPE)
     stdout, err = p.communicate()
     #assert not p.returncode and stdout
@@ -68,7 +95,64 @@ def _virtualenv_sys(venv_path):
     return lines[0], list(filter(bool, lines[1:]))
 
 
-def clone_virtualenv(src_dir, dst_dir, tarball):
+def _virtualenv_layout(venv_path):
+    """Work out the same version and path info as _virtualenv_sys, but
+    from pyvenv.cfg and the venv's lib/pythonX.Y directories instead of
+    by starting its interpreter, which can take seconds on cvmfs.
+
+    The paths are the venv's site-packages directories and the ones
+    its .pth files add; the interpreter's standard library, which lies
+    outside the venv, isn't included."""
+    version = None
+    cfg = os.path.join(venv_path, 'pyvenv.cfg')
+    if os.path.isfile(cfg):
+        with open(cfg) as f:
+            for line in f:
+                key, sep, value = line.partition('=')
+                if sep and key.strip() in ('version', 'version_info'):
+                    version = '.'.join(value.strip().split('.')[:2])
+                    break
+
+    lib_versions = []
+    for libdir in ['lib', 'lib64']:
+        libpath = os.path.join(venv_path, libdir)
+        if os.path.isdir(libpath):
+            lib_versions.extend(
+                (libpath, d[len('python'):]) for d in sorted(os.listdir(libpath))
+                if d.startswith('python') and pybinre.match(d))
+    if version is None:
+        versions = set(v for _, v in lib_versions)
+        if len(versions) != 1:
+            logger.info('can\'t tell the version of %s without running it' % venv_path)
+            return _virtualenv_sys(venv_path)
+        version = versions.pop()
+
+    sys_path = []
+    for libpath, libversion in lib_versions:
+        site_packages = os.path.join(libpath, 'python' + libversion, 'site-packages')
+        if libversion != version or not os.path.isdir(site_packages):
+            continue
+        # lib64 is usually a symlink to lib
+        if any(os.path.samefile(site_packages, p) for p in sys_path):
+            continue
+        sys_path.append(site_packages)
+
+    for site_packages in list(sys_path):
+        for file_ in sorted(os.listdir(site_packages)):
+            if not file_.endswith('.pth'):
+                continue
+            with open(os.path.join(site_packages, file_), errors='replace') as f:
+                for line in f:
+                    line = line.strip()
+                    if not line or line.startswith('#') or line.startswith('import '):
+                        continue
+                    sys_path.append(os.path.normpath(os.path.join(site_packages, line)))
+
+    return version, sys_path
+
+
+def clone_virtualenv(src_dir, dst_dir, tarball, jobs=DEFAULT_COPY_JOBS,
+                     hardlink=False, validate=False):
     if not os.path.exists(src_dir):
         raise UserError('src dir %r does not exist' % src_dir)
     if os.path.exists(dst_dir):
@@ -76,24 +160,17 @@ def clone_virtualenv(src_dir, dst_dir, tarball):
     #sys_path = _virtualenv_syspath(src_dir)
     logger.info('cloning virtualenv \'%s\' => \'%s\'...' %
             (src_dir, dst_dir))
-    found_tarball = False
-    if os.path.isfile(tarball):
-        if tarfile.is_tarfile(tarball):
-            found_tarball = True
-    if found_tarball:
-        with tarfile.open(tarball,"r:gz") as tarfile_obj:
-            tarfile_obj.extractall(os.path.dirname(dst_dir))
+    tarball_format = None
+    if tarball and os.path.isfile(tarball):
+        tarball_format = _tarball_format(tarball)
+    # Both ways of cloning fix up scripts as they go, so they need the
+    # version up front
+    version = _virtualenv_layout(src_dir)[0]
+    if tarball_format:
+        extract_virtualenv(tarball, tarball_format, src_dir, dst_dir, version)
     else:
-        shutil.copytree(src_dir, dst_dir, symlinks=True)
-    for rootDir, subdirs, filenames in os.walk(dst_dir):
-        for filename in fnmatch.filter(filenames, '*.pyc'):
-            try:
-                os.remove(os.path.join(rootDir, filename))
-            except OSError:
-                print("Error while deleting file")
-    version, sys_path = _virtualenv_sys(dst_dir)
-    logger.info('fixing scripts in bin...')
-    fixup_scripts(src_dir, dst_dir, version)
+        copy_virtualenv(src_dir, dst_dir, version, jobs=jobs, hardlink=hardlink)
+    sys_path = _virtualenv_layout(dst_dir)[1]
 
     has_old = lambda s: any(i for i in s if _dirmatch(i, src_dir))
 
@@ -102,52 +179,340 @@ def clone_virtualenv(src_dir, dst_dir, tarball):
         # paths in the sys.path of new python env. right?
         logger.info('fixing paths in sys.path...')
         fixup_syspath_items(sys_path, src_dir, dst_dir)
-    v_sys = _virtualenv_sys(dst_dir)
-    remaining = has_old(v_sys[1])
-    assert not remaining, v_sys
-    fix_symlink_if_necessary(src_dir, dst_dir)
-
-def fix_symlink_if_necessary(src_dir, dst_dir):
-    #sometimes the source virtual environment has symlinks that point to itself
-    #one example is $OLD_VIRTUAL_ENV/local/lib points to $OLD_VIRTUAL_ENV/lib
-    #this function makes sure
-    #$NEW_VIRTUAL_ENV/local/lib will point to $NEW_VIRTUAL_ENV/lib
-    #usually this goes unnoticed unless one tries to upgrade a package though pip, so this bug is hard to find.
-    logger.info("scanning for internal symlinks that point to the original virtual env")
-    for dirpath, dirnames, filenames in os.walk(dst_dir):
-        for a_file in itertools.chain(filenames, dirnames):
-            full_file_path = os.path.join(dirpath, a_file)
-            if os.path.islink(full_file_path):
-                target = os.path.realpath(full_file_path)
-                if target.startswith(src_dir):
-                    new_target = target.replace(src_dir, dst_dir)
-                    logger.debug('fixing symlink in %s' % (full_file_path,))
-                    os.remove(full_file_path)
-                    os.symlink(new_target, full_file_path)
-
-
-def fixup_scripts(old_dir, new_dir, version, rewrite_env_python=False):
-    bin_dir = os.path.join(new_dir, env_bin_dir)
-    root, dirs, files = next(os.walk(bin_dir))
-    pybinre = re.compile(r'pythonw?([0-9]+(\.[0-9]+(\.[0-9]+)?)?)?$')
-    for file_ in files:
-        filename = os.path.join(root, file_)
-        if file_ in ['python', 'python%s' % version, 'activate_this.py']:
-            continue
-        elif file_.startswith('python') and pybinre.match(file_):
-            # ignore other possible python binaries
-            continue
-        elif file_.endswith('.pyc'):
-            # ignore compiled files
-            continue
-        elif file_ == 'activate' or file_.startswith('activate.'):
-            fixup_activate(os.path.join(root, file_), old_dir, new_dir)
-        elif os.path.islink(filename):
-            fixup_link(filename, old_dir, new_dir)
-        elif os.path.isfile(filename):
-            fixup_script_(root, file_, old_dir, new_dir, version,
-                rewrite_env_python=rewrite_env_python)
+    v_sys = _virtualenv_layout(dst_dir)
+    assert not has_old(v_sys[1]), v_sys
+    if validate:
+        # Ask the new venv's interpreter itself, which also catches paths
+        # added in ways the static layout doesn't know about
+        logger.info('validating sys.path of the new virtualenv...')
+        v_sys = _virtualenv_sys(dst_dir)
+        assert not has_old(v_sys[1]), v_sys
+
+
+class _TreeCopier(object):
+    """Copies the files of a virtualenv on a thread pool, fixing up the
+    ones which refer to the old location as they're copied.
+
+    Each file is cloned with the cheapest mechanism the filesystems
+    allow: a reflink, then copy_file_range(2), then a plain copy. With
+    hardlink=True, files which are never rewritten are hardlinked
+    instead when source and destination are on the same filesystem.
+    """
 
+    def __init__(self, src_dir, dst_dir, version, hardlink=False):
+        self.src_dir = src_dir
+        self.dst_dir = dst_dir
+        self.version = version
+        self.hardlink = hardlink
+        self.reflink = fcntl is not None
+        self.copy_file_range = hasattr(os, 'copy_file_range')
+        self.lock = threading.Lock()
+        self.num_files = 0
+        self.num_bytes = 0
+        self.methods = dict.fromkeys(
+            ['hardlink', 'reflink', 'copy_file_range', 'copy'], 0)
+
+    def copy(self, src, dst, size, fixup=None):
+        "Copy SRC to DST and apply FIXUP as returned by _fixup_for"
+
+        if self.hardlink and fixup is None:
+            try:
+                os.link(src, dst)
+                method = 'hardlink'
+            except OSError as e:
+                if e.errno not in (errno.EXDEV, errno.EPERM, errno.EMLINK):
+                    raise
+                # A different filesystem isn't going to stop being one
+                self.hardlink = False
+                method = self._copy_data(src, dst, size)
+        else:
+            method = self._copy_data(src, dst, size)
+
+        if fixup == 'activate':
+            fixup_activate(dst, self.src_dir, self.dst_dir)
+        elif fixup == 'script':
+            fixup_script_(os.path.dirname(dst), os.path.basename(dst),
+                          self.src_dir, self.dst_dir, self.version)
+
+        with self.lock:
+            self.num_files += 1
+            self.num_bytes += size
+            self.methods[method] += 1
+
+    def _copy_data(self, src, dst, size):
+        with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+            method = None
+            if self.reflink and size > 0:
+                try:
+                    fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+                    method = 'reflink'
+                except OSError:
+                    # Either the filesystem can't do it or the two files
+                    # are on different filesystems; neither will change
+                    self.reflink = False
+            if method is None and self.copy_file_range and size > 0:
+                try:
+                    copied = 0
+                    while True:
+                        n = os.copy_file_range(fsrc.fileno(), fdst.fileno(),
+                                               1 << 30)
+                        if n == 0:
+                            break
+                        copied += n
+                    if copied == size:
+                        method = 'copy_file_range'
+                    else:
+                        # Some filesystems (FUSE ones like cvmfs, and
+                        # pseudo-filesystems) report the end of the file
+                        # early, so start over with a plain copy
+                        logger.debug('copy_file_range copied %d of the %d bytes of %s'
+                                     % (copied, size, src))
+                        self.copy_file_range = False
+                        fsrc.seek(0)
+                        fdst.seek(0)
+                        fdst.truncate()
+                except OSError as e:
+                    if e.errno not in (errno.EXDEV, errno.ENOSYS,
+                                       errno.EINVAL, errno.EOPNOTSUPP):
+                        raise
+                    self.copy_file_range = False
+                    # Nothing is written when the very first call fails
+                    if copied:
+                        raise
+            if method is None:
+                shutil.copyfileobj(fsrc, fdst, 1 << 20)
+                method = 'copy'
+        shutil.copystat(src, dst)
+        return method
+
+
+def _fixup_for(dirpath, filename, src_bin_dir, version):
+    """Return how a file has to be fixed up after it's copied: 'activate',
+    'script', 'copy' if it may be rewritten later and so needs to be a
+    copy of its own, or None if it can be used as is."""
+    if filename.endswith('.pth') or filename.endswith('.egg-link'):
+        # Not rewritten here, but possibly by fixup_syspath_items later,
+        # so they mustn't share an inode with the original
+        return 'copy'
+    if dirpath != src_bin_dir:
+        return None
+    if filename in ['python', 'python%s' % version, 'activate_this.py']:
+        return None
+    elif filename.startswith('python') and pybinre.match(filename):
+        return None
+    elif filename == 'activate' or filename.startswith('activate.'):
+        return 'activate'
+    return 'script'
+
+
+def _cloned_link_target(link, target, old_dir, new_dir):
+    """Return what a symlink LINK in OLD_DIR pointing to TARGET should
+    point to once it's copied to NEW_DIR: links within the tree stay as
+    they are if they're relative, or are moved to NEW_DIR if absolute;
+    relative links out of the tree become absolute."""
+    if os.path.isabs(target):
+        resolved = os.path.realpath(target)
+        if _dirmatch(resolved, old_dir):
+            return new_dir + resolved[len(old_dir):]
+        return target
+    resolved = os.path.normpath(os.path.join(os.path.dirname(link), target))
+    if _dirmatch(resolved, old_dir):
+        return target
+    return resolved
+
+
+def _tarball_format(tarball):
+    """Return 'gzip', 'zstd' or 'tar' according to what TARBALL is, or
+    None if it's none of them."""
+    with open(tarball, 'rb') as f:
+        header = f.read(512)
+    if header.startswith(GZIP_MAGIC):
+        return 'gzip'
+    elif header.startswith(ZSTD_MAGIC):
+        return 'zstd'
+    elif header[257:262] == b'ustar':
+        return 'tar'
+    return None
+
+
+def _open_tar_stream(tarball, tarball_format):
+    """Return a stream of the uncompressed contents of TARBALL and the
+    process doing the decompressing, if it's done by an external tool.
+    pigz and zstd decompress on threads of their own, so they're used
+    when they're available."""
+    if tarball_format == 'tar':
+        return open(tarball, 'rb'), None
+
+    tool = {'gzip': ['pigz', 'gzip'], 'zstd': ['zstd']}[tarball_format]
+    for executable in tool:
+        if shutil.which(executable):
+            logger.info('decompressing %s with %s' % (tarball, executable))
+            with open(tarball, 'rb') as f:
+                process = subprocess.Popen([executable, '-d', '-c'], stdin=f,
+                                           stdout=subprocess.PIPE)
+            return process.stdout, process
+
+    if tarball_format == 'gzip':
+        import gzip
+        return gzip.open(tarball, 'rb'), None
+    if zstandard is not None:
+        return zstandard.ZstdDecompressor().stream_reader(open(tarball, 'rb')), None
+    raise UserError('%r is compressed with zstd, but neither the zstd '
+                    'executable nor the zstandard module is available' % tarball)
+
+
+def extract_virtualenv(tarball, tarball_format, src_dir, dst_dir, version):
+    """Extract the tarball of the virtualenv SRC_DIR to DST_DIR in one
+    pass over the archive. The tarball's top-level directory becomes
+    DST_DIR. Compiled *.pyc files aren't extracted at all; the scripts
+    in bin, activate scripts, .pth and .egg-link files are fixed up as
+    they're extracted and symlinks which refer to SRC_DIR are created
+    pointing into DST_DIR."""
+    logger.info('extracting %s...' % tarball)
+    starttime = time.monotonic()
+    stream, process = _open_tar_stream(tarball, tarball_format)
+    os.makedirs(dst_dir)
+    src_bin_dir = os.path.join(src_dir, env_bin_dir)
+    directories = []
+    num_files = num_bytes = 0
+
+    def relocated(name):
+        # Drop the top-level directory, e.g. ".venv/", from a member name
+        parts = name.split('/', 1)
+        return parts[1] if len(parts) > 1 else ''
+
+    try:
+        with tarfile.open(fileobj=stream, mode='r|') as tar:
+            # We trust the release's tarball, including its absolute
+            # symlinks, which newer versions of Python refuse by default
+            tar.extraction_filter = getattr(tarfile, 'fully_trusted_filter', None)
+            for member in tar:
+                name = relocated(member.name)
+                if not name or name.endswith('.pyc'):
+                    continue
+                src = os.path.join(src_dir, name)
+                dst = os.path.join(dst_dir, name)
+                member.name = name
+
+                if member.isdir():
+                    # Permissions and times are set once the directory's
+                    # contents are in place
+                    tar.extract(member, dst_dir, set_attrs=False)
+                    directories.append(member)
+                    continue
+                elif member.issym():
+                    target = _cloned_link_target(src, member.linkname, src_dir, dst_dir)
+                    if target != member.linkname:
+                        logger.debug('fixing symlink in %s' % dst)
+                    member.linkname = target
+                elif member.islnk():
+                    member.linkname = relocated(member.linkname)
+
+                tar.extract(member, dst_dir)
+                num_files += 1
+                num_bytes += member.size
+
+                if not member.isfile():
+                    continue
+                fixup = _fixup_for(os.path.dirname(src), os.path.basename(src),
+                                   src_bin_dir, version)
+                if fixup == 'activate':
+                    fixup_activate(dst, src_dir, dst_dir)
+                elif fixup == 'script':
+                    fixup_script_(os.path.dirname(dst), os.path.basename(dst),
+                                  src_dir, dst_dir, version)
+                elif name.endswith('.pth'):
+                    fixup_pth_file(dst, src_dir, dst_dir)
+                elif name.endswith('.egg-link'):
+                    fixup_egglink_file(dst, src_dir, dst_dir)
+
+            for member in reversed(directories):
+                dst = os.path.join(dst_dir, member.name)
+                tar.chown(member, dst, False)
+                tar.utime(member, dst)
+                tar.chmod(member, dst)
+
+        # Let the decompressor finish writing out the end of the archive
+        while stream.read(1 << 20):
+            pass
+    finally:
+        stream.close()
+        if process is not None:
+            process.wait()
+
+    if process is not None and process.returncode != 0:
+        raise UserError('decompressing %r failed' % tarball)
+
+    elapsed = time.monotonic() - starttime
+    logger.info('extracted %d files (%.1f MB) in %.1f s: %.0f files/s, %.1f MB/s' %
+                (num_files, num_bytes / 1e6, elapsed,
+                 num_files / elapsed if elapsed > 0 else 0,
+                 num_bytes / 1e6 / elapsed if elapsed > 0 else 0))
+
+
+def copy_virtualenv(src_dir, dst_dir, version, jobs=DEFAULT_COPY_JOBS,
+                    hardlink=False):
+    """Copy the virtualenv SRC_DIR to DST_DIR in a single pass over the
+    tree, leaving out compiled *.pyc files and fixing up the scripts in
+    bin and any symlinks which refer to SRC_DIR as it goes."""
+    logger.info('copying virtualenv with %d threads...' % jobs)
+    starttime = time.monotonic()
+    copier = _TreeCopier(src_dir, dst_dir, version, hardlink=hardlink)
+    src_bin_dir = os.path.join(src_dir, env_bin_dir)
+    directories = []
+    os.makedirs(dst_dir)
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, jobs)) as executor:
+        futures = []
+        # Directories are created here, in walk order, so a directory
+        # always exists before any of its files is handed to the pool
+        for dirpath, dirnames, filenames in os.walk(src_dir):
+            dst_dirpath = dst_dir + dirpath[len(src_dir):]
+            if dirpath != src_dir:
+                os.mkdir(dst_dirpath)
+            directories.append((dirpath, dst_dirpath))
+
+            # os.walk lists symlinks to directories with the directories
+            # but doesn't descend into them
+            links = [d for d in dirnames if os.path.islink(os.path.join(dirpath, d))]
+            dirnames[:] = [d for d in dirnames if d not in links]
+
+            with os.scandir(dirpath) as entries:
+                entries = dict((entry.name, entry) for entry in entries)
+
+            for name in itertools.chain(links, filenames):
+                src = os.path.join(dirpath, name)
+                dst = os.path.join(dst_dirpath, name)
+                entry = entries[name]
+                if entry.is_symlink():
+                    target = _cloned_link_target(src, os.readlink(src), src_dir, dst_dir)
+                    if target != os.readlink(src):
+                        logger.debug('fixing symlink in %s' % dst)
+                    os.symlink(target, dst)
+                elif name.endswith('.pyc'):
+                    continue
+                elif entry.is_file(follow_symlinks=False):
+                    fixup = _fixup_for(dirpath, name, src_bin_dir, version)
+                    futures.append(executor.submit(
+                        copier.copy, src, dst, entry.stat(follow_symlinks=False).st_size,
+                        fixup))
+                else:
+                    logger.debug('skipping special file %s' % src)
+
+        for future in concurrent.futures.as_completed(futures):
+            future.result()
+
+    # Deepest first, and only now, in case a directory isn't writable
+    for dirpath, dst_dirpath in reversed(directories):
+        shutil.copystat(dirpath, dst_dirpath)
+
+    elapsed = time.monotonic() - starttime
+    logger.info('copied %d files (%.1f MB) in %.1f s: %.0f files/s, %.1f MB/s (%s)' %
+                (copier.num_files, copier.num_bytes / 1e6, elapsed,
+                 copier.num_files / elapsed if elapsed > 0 else 0,
+                 copier.num_bytes / 1e6 / elapsed if elapsed > 0 else 0,
+                 ', '.join('%s: %d' % (method, n)
+                           for method, n in copier.methods.items() if n)))
 
 def fixup_script_(root, file_, old_dir, new_dir, version,
                   rewrite_env_python=False):
@@ -219,38 +584,6 @@ def fixup_activate(filename, old_dir, new_dir):
         f.write(data.encode('utf-8'))
 
 
-def fixup_link(filename, old_dir, new_dir, target=None):
-    logger.debug('fixing %s' % filename)
-    if target is None:
-        target = os.readlink(filename)
-
-    origdir = os.path.dirname(os.path.abspath(filename)).replace(
-        new_dir, old_dir)
-    if not os.path.isabs(target):
-        target = os.path.abspath(os.path.join(origdir, target))
-        rellink = True
-    else:
-        rellink = False
-
-    if _dirmatch(target, old_dir):
-        if rellink:
-            # keep relative links, but don't keep original in case it
-            # traversed up out of, then back into the venv.
-            # so, recreate a relative link from absolute.
-            target = target[len(origdir):].lstrip(os.sep)
-        else:
-            target = target.replace(old_dir, new_dir, 1)
-
-    # else: links outside the venv, replaced with absolute path to target.
-    _replace_symlink(filename, target)
-
-
-def _replace_symlink(filename, newtarget):
-    tmpfn = "%s.new" % filename
-    os.symlink(newtarget, tmpfn)
-    os.rename(tmpfn, filename)
-
-
 def fixup_syspath_items(syspath, old_dir, new_dir):
     for path in syspath:
         if not os.path.isdir(path):
@@ -318,7 +651,28 @@ def main():
             dest='tarball',
             metavar="TAR_FILE",
             default=None,
-            help='path to tarball in tar.gz format')
+            help='path to a tarball of the venv, as .tar.gz, .tar.zst '
+                 'or plain .tar')
+    parser.add_option('-j',
+            '--jobs',
+            dest='jobs',
+            type='int',
+            default=DEFAULT_COPY_JOBS,
+            help='number of files to copy at once when there is no '
+                 'tarball [default: %default]')
+    parser.add_option('-l',
+            '--hardlink',
+            action='store_true',
+            dest='hardlink',
+            default=False,
+            help='hardlink files which are never modified instead of '
+                 'copying them, when both venvs are on one filesystem')
+    parser.add_option('--validate',
+            action='store_true',
+            dest='validate',
+            default=False,
+            help='check the sys.path of the cloned venv by running its '
+                 'interpreter once it has been cloned')
     options, args = parser.parse_args()
     try:
         old_dir, new_dir = args
@@ -331,7 +685,9 @@ def main():
             options.verbose)]
     logging.basicConfig(level=loglevel, format='%(message)s')
     try:
-        clone_virtualenv(old_dir, new_dir, options.tarball)
+        clone_virtualenv(old_dir, new_dir, options.tarball,
+                         jobs=options.jobs, hardlink=options.hardlink,
+                         validate=options.validate)
     except UserError:
         e = sys.exc_info()[1]
         parser.error(str(e))
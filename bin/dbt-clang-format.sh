@@ -24,6 +24,10 @@ If the optional $view_only_option argument is supplied, then
 instead of actually editing the files, it'll simply show what edits
 would be made
 
+Files are checked in parallel, and files which were already properly
+formatted the last time they were checked (with the same .clang-format
+and clang-format) are skipped unless they've changed since
+
 EOF
 
     exit 1
@@ -53,10 +57,26 @@ script. Exiting..."
 
 fi
 
-which clang-format > /dev/null 2>&1
-retval=$?
+# Both the path of clang-format, which can take spack several seconds
+# to find, and the hashes of the files known to be properly formatted
+# are kept in the work area
+cache_dir=${DBT_AREA_ROOT}/${DBT_CACHE_DIR}/clang-format
+clang_format_path_file=$cache_dir/clang-format-path
+mkdir -p $cache_dir
+
+CLANG_FORMAT=""
+if [[ -f $clang_format_path_file ]]; then
+    read cached_release CLANG_FORMAT < $clang_format_path_file
+    if [[ "$cached_release" != "${SPACK_RELEASE:-none}" || ! -x $CLANG_FORMAT ]]; then
+        CLANG_FORMAT=""
+    fi
+fi
+
+if [[ -z $CLANG_FORMAT ]]; then
+    CLANG_FORMAT=$( which clang-format 2>/dev/null )
+fi
 
-if [[ "$retval" != "0" ]]; then
+if [[ -z $CLANG_FORMAT ]]; then
     if [[ -n $SPACK_ROOT ]]; then
     
         clang_spack_dir="/cvmfs/dunedaq.opensciencegrid.org/spack/externals"
@@ -92,8 +112,15 @@ you've got set up. Exiting..."
             fi
         fi
     fi
+
+    CLANG_FORMAT=$( which clang-format 2>/dev/null )
+    if [[ -z $CLANG_FORMAT ]]; then
+        error "Unable to find clang-format; exiting..."
+    fi
 fi
 
+echo "${SPACK_RELEASE:-none} $CLANG_FORMAT" > $clang_format_path_file
+
 clang_format_link="https://raw.githubusercontent.com/DUNE-DAQ/daq-buildtools/develop/configs/.clang-format"
 
 mv -f .clang-format .clang-format.previous  2>/dev/null # In case .clang-format's been updated in daq-buildtools since this script was run
@@ -105,37 +132,73 @@ if [[ "$?" != "0" ]]; then
 fi
 
 
+# Known properly formatted files are recorded by content hash, in a
+# file specific to the formatting rules and clang-format version
+style_hash=$( { cat .clang-format; echo $CLANG_FORMAT; $CLANG_FORMAT --version; } | sha256sum | cut -c1-16 )
+clean_hashes_file=$cache_dir/clean-files-${style_hash}.txt
+touch $clean_hashes_file
+
+# Called with the file's hash and name, separated by whitespace, as
+# sha256sum prints them. Its output is written all at once, so the
+# output for different files doesn't get mixed up
+function format_file() {
+
+    local differences_only=$1
+    local file_hash orig_file
+    read file_hash orig_file <<< "$2"
+
+    local tmpfile=$( mktemp )
+    if ! $CLANG_FORMAT -style=file $orig_file > $tmpfile; then
+        rm -f $tmpfile
+        echo -e "${COL_RED}clang-format failed on ${orig_file}${COL_RESET}" >&2
+        return 1
+    fi
+
+    local res
+    res=$( diff $tmpfile $orig_file )
+    local diff_retval="$?"
+
+    if [[ "$diff_retval" == 0 ]]; then
+        rm -f $tmpfile
+        echo $file_hash >> $new_clean_hashes_file
+        echo -e "Processing ${orig_file}...\n\n$orig_file already properly formatted\n"
+    elif $differences_only ; then
+        rm -f $tmpfile
+        echo "$file_hash $orig_file" >> $files_needing_formatting
+        echo -e "Processing ${orig_file}...\n ${COL_RED} ${res} ${COL_RESET} "
+    else
+        # Written back in place rather than moved, so the file keeps its permissions
+        cat $tmpfile > $orig_file
+        rm -f $tmpfile
+        sha256sum $orig_file | cut -d" " -f1 >> $new_clean_hashes_file
+        echo -e "Updating $orig_file with new formatting\n"
+    fi
+}
+export -f format_file
+
+new_clean_hashes_file=$( mktemp )
+files_needing_formatting=$( mktemp )
+trap "rm -f $new_clean_hashes_file $files_needing_formatting" EXIT
+export CLANG_FORMAT COL_RED COL_RESET new_clean_hashes_file files_needing_formatting
+
 function format_files() {
 
     local differences_only=$1
     local files_to_format=$2
 
-    for orig_file in $files_to_format ; do
-
-	echo "Processing ${orig_file}..."
-	tmpfile=/tmp/$( uuidgen )
-	clang-format -style=file $orig_file > $tmpfile
-	res=$( diff $tmpfile $orig_file )
-	diff_retval="$?"
-	echo -e " ${COL_RED} ${res} ${COL_RESET} " 
-	
-	if [[ "$diff_retval" == 0 ]]; then
-	    echo
-	    echo "$orig_file already properly formatted"
-	    echo
-	elif ! $differences_only ; then
-	    echo "Updating $orig_file with new formatting"
-	    echo
-	    mv $tmpfile $orig_file
-	fi
-    done
+    echo "$files_to_format" | grep -v '^$' | \
+        xargs -r -P $( nproc ) -I{} bash -c 'format_file $0 "$1"' $differences_only {}
+
+    # Only the hashes of files seen clean in this run are kept, so ones
+    # of files which have changed or gone since don't pile up
+    sort -u $new_clean_hashes_file -o $clean_hashes_file
 }
 
 files_to_format=""
 extensions="*.hpp *.cpp *.cxx *.hxx"
 
 if [[ -d $filename ]]; then
-    files_to_format=$( for extension in $extensions ; do find $filename -name $extension; done )
+    files_to_format=$( find $filename \( -name "*.hpp" -o -name "*.cpp" -o -name "*.cxx" -o -name "*.hxx" \) -type f )
 elif [[ -f $filename ]]; then
     extension=$( echo $filename | sed -r 's/.*\.([^.]+)$/\1/' )
 
@@ -146,9 +209,22 @@ elif [[ -f $filename ]]; then
     fi
 fi
 
+num_files=$( echo "$files_to_format" | grep -c . )
+hashed_files=$( echo "$files_to_format" | grep -v '^$' | xargs -r sha256sum )
+echo "$hashed_files" | grep -F -f <( sed 's/$/  /' $clean_hashes_file ) | cut -d" " -f1 >> $new_clean_hashes_file
+files_to_format=$( echo "$hashed_files" | grep -v -F -f <( sed 's/$/  /' $clean_hashes_file ) )
+num_skipped=$(( num_files - $( echo "$files_to_format" | grep -c . ) ))
+
 format_files true "$files_to_format"
 
-if ! $differences_only ; then
+if [[ $num_skipped -gt 0 ]]; then
+    echo "Skipped $num_skipped of the $num_files files as they were already properly formatted the last time they were checked"
+    echo
+fi
+
+files_to_format=$( cat $files_needing_formatting )
+
+if ! $differences_only && [[ -n $files_to_format ]]; then
     
     cat<<EOF
 You ran this script without the $view_only_option option, are you
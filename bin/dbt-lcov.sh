@@ -5,36 +5,82 @@ function print_usage() {
 Usage
 -----
 
-lcov has to be installed manually -- 
+$( basename $0 ) [-j/--jobs <number of jobs>] [--no-clean] [--full] [-h/--help]
+
+  -j/--jobs: how many unit test suites to run, and packages to collect coverage
+             for, at a time (default: the number of processors)
+  --no-clean: instead of performing a clean build, add the coverage flags below
+              to the configuration of the existing build directory if they're
+              missing, and only rebuild what needs to be
+  --full: collect the coverage of every package again, rather than reusing what
+          was collected for a package the last time if its .gcno and .gcda
+          files haven't changed since
+
+lcov has to be installed manually --
 https://github.com/linux-test-project/lcov/releases/tag/v1.15
 lcov-1.15-1.noarch.rpm
 
 Upon success, the output will be in the "coverage" directory
 Load the file coverage/index.html in your browser to view the coverage report
 
-The following should be in CMakeLists.txt at or above the level of the code
-for which coverage information should be collected 
+Unless you use --no-clean, the following should be in CMakeLists.txt at or above
+the level of the code for which coverage information should be collected
 (e.g. sourcecode/CMakeLists.txt, above its daq_add_subpackages call):
 
-SET(GCC_COVERAGE_COMPILE_FLAGS "-O0 -g -fprofile-arcs -ftest-coverage -fno-inline")
-SET(GCC_COVERAGE_LINK_FLAGS    "-lgcov")
+SET(GCC_COVERAGE_COMPILE_FLAGS "${GCC_COVERAGE_COMPILE_FLAGS}")
+SET(GCC_COVERAGE_LINK_FLAGS    "${GCC_COVERAGE_LINK_FLAGS}")
 
 SET(CMAKE_CXX_FLAGS  "\${CMAKE_CXX_FLAGS} \${GCC_COVERAGE_COMPILE_FLAGS}")
 SET(CMAKE_EXE_LINKER_FLAGS  "\${CMAKE_EXE_LINKER_FLAGS} \${GCC_COVERAGE_LINK_FLAGS}")
 
 Coverage requires at least GCC v9_3_0 to work properly
-    
+
 EOU
 }
 
+GCC_COVERAGE_COMPILE_FLAGS="-O0 -g -fprofile-arcs -ftest-coverage -fno-inline"
+GCC_COVERAGE_LINK_FLAGS="-lgcov"
+
+options=$(getopt -o 'hj:' -l 'help,jobs:,no-clean,full' -- "$@") || { print_usage; exit 1; }
+eval "set -- $options"
+
+jobs=$( nproc )
+clean_build=true
+full_capture=false
+while true; do
+    case $1 in
+        (-j|--jobs)
+            jobs=$2
+            shift 2;;
+        (--no-clean)
+            clean_build=false
+            shift;;
+        (--full)
+            full_capture=true
+            shift;;
+        (-h|--help)
+            print_usage
+            exit 0;;
+        (--)
+            shift
+            break;;
+    esac
+done
+
 if [ $# -gt 0 ]; then
   print_usage
-  exit 0
+  exit 1
 fi
 
 source ${DBT_ROOT}/scripts/dbt-setup-tools.sh
 LOGDIR=${DBT_AREA_ROOT}/log
+BUILD_DIR=${DBT_AREA_ROOT}/build
 lcov_log=$LOGDIR/lcov_report_$( date | sed -r 's/[: ]+/_/g' ).log
+test_log_dir=${lcov_log%.log}_unit_tests
+
+# What was collected for each package last time, along with hashes of
+# the .gcno and .gcda files it was collected from
+LCOV_CACHE_DIR=${DBT_AREA_ROOT}/${DBT_CACHE_DIR}/lcov
 
 lcov_found=`type lcov >/dev/null 2>&1 && echo 0 || echo 1`
 if [ $lcov_found -ne 0 ]; then
@@ -52,17 +98,61 @@ if [ ${gccver:-0} -lt 9 ]; then
   exit 2
 fi
 
-echo "Performing clean build, please wait" |& tee -a $lcov_log
-dbt-build --clean >$lcov_log 2>&1 || error "dbt-build --clean returned nonzero; exiting..."
-echo "Clean build complete. Setting up LCOV counters" |& tee -a $lcov_log
+function cmake_cache_value() {
+  sed -n "s/^$1:[A-Z]*=//p" $BUILD_DIR/CMakeCache.txt
+}
 
-lcov -d $DBT_AREA_ROOT --zerocounters >>$lcov_log 2>&1 || error "lcov -d $DBT_AREA_ROOT --zerocounters returned nonzero; exiting..."
-lcov -c -i -d $DBT_AREA_ROOT -o  $DBT_AREA_ROOT/dunedaq.base >>$lcov_log 2>&1 || error "lcov -c -i -d $DBT_AREA_ROOT -o  $DBT_AREA_ROOT/dunedaq.base returned nonzero; exiting..."
+if $clean_build; then
+  echo "Performing clean build, please wait" |& tee -a $lcov_log
+  dbt-build --clean >$lcov_log 2>&1 || error "dbt-build --clean returned nonzero; exiting..."
+  echo "Clean build complete. Setting up LCOV counters" |& tee -a $lcov_log
+else
+  if [[ ! -e $BUILD_DIR/CMakeCache.txt ]]; then
+    echo "Running CMake's config+generate stages, please wait" |& tee -a $lcov_log
+    dbt-build >>$lcov_log 2>&1 || error "dbt-build returned nonzero; exiting..."
+  fi
+
+  if [[ ! "$( cmake_cache_value CMAKE_CXX_FLAGS )" =~ "-fprofile-arcs" ]]; then
+    echo "Adding the coverage flags to the configuration of $BUILD_DIR" |& tee -a $lcov_log
+    cmake -DCMAKE_CXX_FLAGS="$( cmake_cache_value CMAKE_CXX_FLAGS ) ${GCC_COVERAGE_COMPILE_FLAGS}" \
+          -DCMAKE_EXE_LINKER_FLAGS="$( cmake_cache_value CMAKE_EXE_LINKER_FLAGS ) ${GCC_COVERAGE_LINK_FLAGS}" \
+          -DCMAKE_SHARED_LINKER_FLAGS="$( cmake_cache_value CMAKE_SHARED_LINKER_FLAGS ) ${GCC_COVERAGE_LINK_FLAGS}" \
+          $BUILD_DIR >>$lcov_log 2>&1 || error "Unable to add the coverage flags to the configuration of $BUILD_DIR; exiting..."
+  fi
+
+  echo "Performing build, please wait" |& tee -a $lcov_log
+  dbt-build >>$lcov_log 2>&1 || error "dbt-build returned nonzero; exiting..."
+  echo "Build complete. Setting up LCOV counters" |& tee -a $lcov_log
+fi
+
+# The .gcda files are the counters, and they're all under the build directory
+find $BUILD_DIR -name '*.gcda' -delete
 
 # RUN THE TESTS
-dbt-unittest-summary.sh |& tee -a $lcov_log
+echo |& tee -a $lcov_log
+echo "RUNNING UNIT TESTS, UP TO $jobs AT A TIME" |& tee -a $lcov_log
+echo "======================================================================" |& tee -a $lcov_log
+
+function run_unit_test() {
+  local unittest=$1
+  local relpath=${unittest#$BUILD_DIR/}
+  local test_log=$test_log_dir/${relpath//\//_}.log
+
+  if $unittest >$test_log 2>&1; then
+    printf "%-70s${COL_GREEN}SUCCESS${COL_RESET}\n" "$relpath"
+  else
+    printf "%-70s${COL_RED}FAILED${COL_RESET}\n" "$relpath"
+  fi
+}
+export -f run_unit_test
+export BUILD_DIR test_log_dir COL_GREEN COL_RED COL_RESET
+
+mkdir -p $test_log_dir
+find -L $BUILD_DIR -mindepth 3 -maxdepth 3 -path "$BUILD_DIR/*/unittest/*" -type f -executable | sort | \
+    xargs -r -P $jobs -I{} bash -c 'run_unit_test "$1"' _ {} |& tee -a $lcov_log
+echo "Unit test output is saved in $test_log_dir" |& tee -a $lcov_log
+
 
-       
   COL_YELLOW="\e[33m"
   COL_RESET="\e[0m"
   COL_RED="\e[31m"
@@ -105,13 +195,72 @@ dbt-unittest-summary.sh |& tee -a $lcov_log
     echo  |& tee -a $lcov_log
     echo -e "${COL_YELLOW}Testing complete for package \"$pkgname\". Ran $num_tests tests.${COL_RESET}" |& tee -a $lcov_log
   done
-     
-  echo "Collecting coverage results"  |& tee -a $lcov_log
-lcov -d  $DBT_AREA_ROOT --capture --output-file  $DBT_AREA_ROOT/dunedaq.info >>$lcov_log 2>&1 || \
-error "lcov -d  $DBT_AREA_ROOT --capture --output-file  $DBT_AREA_ROOT/dunedaq.info returned nonzero; exiting..."
 
-lcov -a dunedaq.base -a  $DBT_AREA_ROOT/dunedaq.info --output-file  $DBT_AREA_ROOT/dunedaq.total >>$lcov_log 2>&1 || \
-error "lcov -a dunedaq.base -a  $DBT_AREA_ROOT/dunedaq.info --output-file  $DBT_AREA_ROOT/dunedaq.total returned nonzero; exiting..."
+  echo "Collecting coverage results, up to $jobs packages at a time"  |& tee -a $lcov_log
+
+# Hash of the names and contents of the files matching a pattern in a
+# package's build directory
+function hash_package_files() {
+  ( cd $BUILD_DIR/$1 && find . -name "$2" -print0 | sort -z | xargs -0 -r sha256sum | sha256sum | cut -d" " -f1 )
+}
+
+# Collects the coverage of a package into $LCOV_CACHE_DIR/<package>.base
+# (the lines there are, from the .gcno files) and <package>.info (the
+# lines the tests ran, from the .gcda files), unless they were already
+# collected from the same files last time
+function capture_package() {
+  local pkg=$1
+  local pkgdir=$BUILD_DIR/$pkg
+  local pkglog=$LCOV_CACHE_DIR/$pkg.log
+
+  if [[ -z $( find $pkgdir -name '*.gcno' -print -quit ) ]]; then
+    rm -f $LCOV_CACHE_DIR/$pkg.*
+    echo "$pkg: no coverage information (not built with the coverage flags?)"
+    return 0
+  fi
+
+  local gcno_hash=$( hash_package_files $pkg '*.gcno' )
+  local gcda_hash=${gcno_hash}:$( hash_package_files $pkg '*.gcda' )
+  local base_action="reused" info_action="reused"
+
+  if $full_capture || [[ ! -s $LCOV_CACHE_DIR/$pkg.base || "$( cat $LCOV_CACHE_DIR/$pkg.gcno_hash 2>/dev/null )" != "$gcno_hash" ]]; then
+    rm -f $LCOV_CACHE_DIR/$pkg.gcno_hash
+    lcov -c -i -d $pkgdir -o $LCOV_CACHE_DIR/$pkg.base >$pkglog 2>&1 || { echo "$pkg: lcov -c -i -d $pkgdir returned nonzero; see $pkglog" >&2; return 1; }
+    echo $gcno_hash > $LCOV_CACHE_DIR/$pkg.gcno_hash
+    base_action="collected"
+  fi
+
+  if [[ -z $( find $pkgdir -name '*.gcda' -print -quit ) ]]; then
+    rm -f $LCOV_CACHE_DIR/$pkg.info $LCOV_CACHE_DIR/$pkg.gcda_hash
+    info_action="not run by any test"
+  elif $full_capture || [[ ! -s $LCOV_CACHE_DIR/$pkg.info || "$( cat $LCOV_CACHE_DIR/$pkg.gcda_hash 2>/dev/null )" != "$gcda_hash" ]]; then
+    rm -f $LCOV_CACHE_DIR/$pkg.gcda_hash
+    lcov -c -d $pkgdir -o $LCOV_CACHE_DIR/$pkg.info >>$pkglog 2>&1 || { echo "$pkg: lcov -c -d $pkgdir returned nonzero; see $pkglog" >&2; return 1; }
+    echo $gcda_hash > $LCOV_CACHE_DIR/$pkg.gcda_hash
+    info_action="collected"
+  fi
+
+  echo "$pkg: baseline $base_action, test coverage $info_action"
+}
+export -f hash_package_files capture_package
+export LCOV_CACHE_DIR full_capture
+
+mkdir -p $LCOV_CACHE_DIR
+packages=$( find $BUILD_DIR -mindepth 1 -maxdepth 1 -type d -not -name CMakeFiles -printf "%f\n" | sort )
+echo "$packages" | xargs -r -P $jobs -I{} bash -c 'capture_package "$1"' _ {} |& tee -a $lcov_log
+[[ ${PIPESTATUS[1]} == 0 ]] || error "Collecting the coverage of at least one package failed; exiting..."
+
+tracefiles=()
+for pkg in $packages; do
+  for tracefile in $LCOV_CACHE_DIR/$pkg.base $LCOV_CACHE_DIR/$pkg.info; do
+    [[ -s $tracefile ]] && tracefiles+=( -a $tracefile )
+  done
+done
+
+[[ ${#tracefiles[@]} -gt 0 ]] || error "No coverage information was found in $BUILD_DIR; exiting..."
+
+lcov "${tracefiles[@]}" --output-file  $DBT_AREA_ROOT/dunedaq.total >>$lcov_log 2>&1 || \
+error "Merging the coverage of the packages into $DBT_AREA_ROOT/dunedaq.total returned nonzero; exiting..."
 
 lcov --remove  $DBT_AREA_ROOT/dunedaq.total '*/products/*' '/usr/include/*' '/cvmfs/*' "$DBT_AREA_ROOT/build/*" "*/pybindsrc/*" --output-file  $DBT_AREA_ROOT/dunedaq.info.cleaned >>$lcov_log 2>&1 || \
 error "lcov --remove  $DBT_AREA_ROOT/dunedaq.total '*/products/*' '*/opt/spack/*' '/usr/include/*' '/cvmfs/*' "$DBT_AREA_ROOT/build/*" --output-file  $DBT_AREA_ROOT/dunedaq.info.cleaned returned nonzero; exiting..."
@@ -123,4 +272,4 @@ error "genhtml --demangle-cpp -o  $DBT_AREA_ROOT/coverage  $DBT_AREA_ROOT/duneda
 
 echo
 echo "Full LCOV output saved in $lcov_log"
-echo 
+echo
@@ -104,6 +104,152 @@ macro(daq_topproj_setpkg_gnudirs pkg)
 endmacro(daq_topproj_setpkg_gnudirs)
 
 
+####################################################################################################
+# daq_find_subpackage_dependencies
+# This function sets daq_subpackage_deps_${pkg} in the caller's scope to the packages among the 
+# remaining arguments which ${pkg}'s CMakeLists.txt refers to, either via find_package(), via a 
+# namespaced target (e.g. "appfwk::appfwk" in LINK_LIBRARIES) or in the DEP_PKGS of daq_codegen()
+function(daq_find_subpackage_dependencies pkg)
+
+  file(READ ${CMAKE_CURRENT_LIST_DIR}/${pkg}/CMakeLists.txt contents)
+  string(REGEX REPLACE "#[^\n]*" "" contents "${contents}")
+
+  set(mentioned "")
+
+  string(REGEX MATCHALL "find_package[ \t\n]*\\([ \t\n]*[A-Za-z0-9_.+-]+" matches "${contents}")
+  foreach(match ${matches})
+    string(REGEX REPLACE "^find_package[ \t\n]*\\([ \t\n]*" "" match "${match}")
+    list(APPEND mentioned ${match})
+  endforeach()
+
+  string(REGEX MATCHALL "[A-Za-z0-9_.+-]+::" matches "${contents}")
+  foreach(match ${matches})
+    string(REGEX REPLACE "::$" "" match "${match}")
+    list(APPEND mentioned ${match})
+  endforeach()
+
+  string(REGEX MATCHALL "DEP_PKGS([ \t\n]+[A-Za-z0-9_.+-]+)+" matches "${contents}")
+  foreach(match ${matches})
+    string(REGEX REPLACE "[ \t\n]+" ";" match "${match}")
+    list(APPEND mentioned ${match})
+  endforeach()
+
+  set(deps "")
+  foreach(candidate ${ARGN})
+    if (NOT candidate STREQUAL pkg AND candidate IN_LIST mentioned)
+      list(APPEND deps ${candidate})
+    endif()
+  endforeach()
+
+  set(daq_subpackage_deps_${pkg} ${deps} PARENT_SCOPE)
+
+endfunction()
+
+
+####################################################################################################
+# daq_sort_subpackages
+# This function sets ${result} to the packages given as the remaining arguments, in the same order
+# except where a package would come before one it depends on (per daq_find_subpackage_dependencies,
+# which needs to have been called for each of them). In that case the package is moved to after 
+# its dependencies. The dependencies are only guessed from the CMakeLists.txt files, so if they
+# appear to form a cycle this is warned about and the packages are left in the order given
+function(daq_sort_subpackages result)
+
+  set(remaining ${ARGN})
+  set(sorted "")
+
+  while(remaining)
+    set(next "")
+    foreach(pkg ${remaining})
+      set(ready TRUE)
+      foreach(dep ${daq_subpackage_deps_${pkg}})
+        if (dep IN_LIST remaining)
+          set(ready FALSE)
+          break()
+        endif()
+      endforeach()
+      if (ready)
+        set(next ${pkg})
+        break()
+      endif()
+    endforeach()
+
+    if (next STREQUAL "")
+      set(cycle "")
+      foreach(pkg ${remaining})
+        string(REPLACE ";" ", " deps "${daq_subpackage_deps_${pkg}}")
+        string(APPEND cycle "\n  ${pkg} -> ${deps}")
+      endforeach()
+      message(WARNING "The dependencies found between the following packages form a cycle, so they'll be built in the order given instead:${cycle}")
+      set(${result} ${ARGN} PARENT_SCOPE)
+      return()
+    endif()
+
+    list(REMOVE_ITEM remaining ${next})
+    list(APPEND sorted ${next})
+  endwhile()
+
+  set(${result} ${sorted} PARENT_SCOPE)
+
+endfunction()
+
+
+####################################################################################################
+# daq_place_unlisted_subpackages
+# This function sets ${result} to the packages in the list named ${listed_var}, with each of the 
+# packages given as the remaining arguments inserted right after the last of them it depends on 
+# (per daq_find_subpackage_dependencies), or appended if it doesn't depend on any of them
+function(daq_place_unlisted_subpackages result listed_var)
+
+  set(placed ${${listed_var}})
+
+  foreach(pkg ${ARGN})
+    set(position -1)
+    set(index 0)
+    foreach(placed_pkg ${placed})
+      math(EXPR index "${index} + 1")
+      if (placed_pkg IN_LIST daq_subpackage_deps_${pkg})
+        set(position ${index})
+      endif()
+    endforeach()
+
+    list(LENGTH placed num_placed)
+    if (position EQUAL -1 OR position EQUAL num_placed)
+      list(APPEND placed ${pkg})
+    else()
+      list(INSERT placed ${position} ${pkg})
+    endif()
+  endforeach()
+
+  set(${result} ${placed} PARENT_SCOPE)
+
+endfunction()
+
+
+####################################################################################################
+# daq_add_pre_build_stages_target
+# This function makes each package's ${pkg}_pre_build_stage_done target (the code generation 
+# which dbt-build --codegen-only runs) depend on those of the packages it depends on, and adds a 
+# dbt_pre_build_stages target which depends on all of them. Building that one target then runs 
+# the code generation of independent packages in parallel
+function(daq_add_pre_build_stages_target)
+
+  add_custom_target(dbt_pre_build_stages)
+
+  foreach(pkg ${ARGN})
+    if (TARGET ${pkg}_pre_build_stage_done)
+      add_dependencies(dbt_pre_build_stages ${pkg}_pre_build_stage_done)
+      foreach(dep ${daq_subpackage_deps_${pkg}})
+        if (TARGET ${dep}_pre_build_stage_done)
+          add_dependencies(${pkg}_pre_build_stage_done ${dep}_pre_build_stage_done)
+        endif()
+      endforeach()
+    endif()
+  endforeach()
+
+endfunction()
+
+
 ####################################################################################################
 macro(daq_add_subpackages build_order)
 
@@ -122,12 +268,35 @@ macro(daq_add_subpackages build_order)
     endif()
   endforeach()
 
+  foreach(pkg ${known_pkgs} ${found_pkgs})
+    daq_find_subpackage_dependencies(${pkg} ${known_pkgs} ${found_pkgs})
+  endforeach()
+
+  # Check the build order against the dependencies found in the packages' CMakeLists.txt files
+  set(preceding_pkgs "")
+  foreach(pkg ${known_pkgs})
+    foreach(dep ${daq_subpackage_deps_${pkg}})
+      if (${dep} IN_LIST known_pkgs AND NOT ${dep} IN_LIST preceding_pkgs)
+        message(WARNING "Package \"${pkg}\" depends on \"${dep}\" but comes before it in ${CMAKE_CURRENT_SOURCE_DIR}/dbt-build-order.cmake. ${dep} will be built first.")
+      endif()
+    endforeach()
+    list(APPEND preceding_pkgs ${pkg})
+  endforeach()
+
+  daq_place_unlisted_subpackages(placed_pkgs known_pkgs ${found_pkgs})
+  daq_sort_subpackages(pkgs ${placed_pkgs})
+
   # Warn the user that the build order of some package is not known
   foreach(pkg ${found_pkgs})
-    message(WARNING "Package \"${pkg}\" not provided to the daq_add_subpackages function in ${CMAKE_CURRENT_SOURCE_DIR}/CMakeLists.txt. ${pkg} will only be built after the provided packages are built. There's no guarantee this is the correct order; if you know where ${pkg} should be in the dependency hierarchy add it to its appropriate place in ${CMAKE_CURRENT_SOURCE_DIR}/dbt-build-order.cmake")
+    if (daq_subpackage_deps_${pkg})
+      string(REPLACE ";" ", " deps "${daq_subpackage_deps_${pkg}}")
+      set(position "It will be built right after the last of the packages it depends on (${deps})")
+    else()
+      set(position "No packages it depends on were found, so it will be built last")
+    endif()
+    message(WARNING "Package \"${pkg}\" not provided to the daq_add_subpackages function in ${CMAKE_CURRENT_SOURCE_DIR}/CMakeLists.txt. ${position}; if you know where ${pkg} should be in the dependency hierarchy add it to its appropriate place in ${CMAKE_CURRENT_SOURCE_DIR}/dbt-build-order.cmake")
   endforeach()
   
-  set(pkgs ${known_pkgs} ${found_pkgs})
   message(STATUS "Package build order: ${pkgs}")
 
   foreach (pkg ${pkgs})
@@ -138,5 +307,6 @@ macro(daq_add_subpackages build_order)
 
   daq_topproj_restore_gnudirs()
 
-endmacro()
+  daq_add_pre_build_stages_target(${pkgs})
 
+endmacro()
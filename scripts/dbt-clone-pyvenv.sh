@@ -51,8 +51,22 @@ else
     echo -e "${PARENT_VENV}. "
     echo -e "Depending on a variety of factors this can take from several seconds to several minutes..."
 
-    TARFILE=$(dirname ${PARENT_VENV})/venv.tar.gz
-    ${HERE}/../bin/clonevirtualenv.py ${PARENT_VENV} ${DBT_AREA_ROOT}/${DBT_VENV} -t $TARFILE
+    # Releases may ship the venv as a tarball next to it, which is faster
+    # to unpack than copying the venv's files one by one
+    TARFILE=""
+    for tarball in venv.tar.zst venv.tar venv.tar.gz; do
+        if [[ -f $(dirname ${PARENT_VENV})/$tarball ]]; then
+            TARFILE=$(dirname ${PARENT_VENV})/$tarball
+            break
+        fi
+    done
+
+    if [[ -n $DBT_VENV_CACHE && $DBT_VENV_CACHE != "0" ]]; then
+        REQUIREMENTS=$(dirname ${PARENT_VENV})/pyvenv_requirements.txt
+        ${HERE}/dbt_venv_cache.py -v ${TARFILE:+-t $TARFILE} -r $REQUIREMENTS $SPACK_RELEASE ${PARENT_VENV} ${DBT_AREA_ROOT}/${DBT_VENV}
+    else
+        ${HERE}/../bin/clonevirtualenv.py -v ${PARENT_VENV} ${DBT_AREA_ROOT}/${DBT_VENV} ${TARFILE:+-t $TARFILE}
+    fi
 
     test $? -eq 0 || error "Problem creating virtual_env ${DBT_VENV}. Exiting..." 
 
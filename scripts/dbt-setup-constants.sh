@@ -1,6 +1,7 @@
 DBT_VENV=".venv"
 DBT_VENV_PROMPT="dbt"
 DBT_AREA_FILE="dbt-workarea-constants.sh"
+DBT_CACHE_DIR=".dbt-cache"
 DISABLE_USER_SPACK_CONFIG="true"
 
 PROD_BASEPATH="/cvmfs/dunedaq.opensciencegrid.org/spack/releases"
@@ -84,6 +84,151 @@ function add_many_paths_if_exist() {
 }
 #------------------------------------------------------------------------------
 
+#------------------------------------------------------------------------------
+# compose_path [-p] <variable> <directory>...
+#
+# Same result as calling add_path on each of the directories in turn, but
+# done in one pass over the variable rather than one per directory, and
+# with any duplicates already in the variable dropped as well. With -p,
+# the result is then ordered the way prioritize_directories orders it.
+# The variable is exported, unless it would be empty, in which case it's
+# left alone. How many of the directories don't exist is reported in one
+# line, since e.g. each one in LD_LIBRARY_PATH costs a failed lookup every
+# time a library is loaded
+function compose_path() {
+  local prioritize=false
+  if [[ "$1" == "-p" ]]; then
+    prioritize=true
+    shift
+  fi
+
+  if [[ $# -lt 1 ]]; then
+    echo "compose_path: needs at least 1 argument"
+    return 1
+  fi
+
+  local path_name=$1
+  local additions=( "${@:2}" )
+  local existing=()
+  IFS=':' read -r -a existing <<< "${!path_name}"
+
+  local -A seen=()
+  local ordered=()
+  local num_missing=0
+  local dir i
+
+  # add_path puts each directory in front, so the last one added ends up first
+  for (( i=${#additions[@]}-1; i>=0; i-- )); do
+    dir=${additions[$i]}
+    [[ -z $dir || -n ${seen[$dir]} ]] && continue
+    seen[$dir]=1
+    ordered+=("$dir")
+    [[ -d $dir ]] || num_missing=$(( num_missing + 1 ))
+  done
+
+  for dir in "${existing[@]}"; do
+    [[ -z $dir || -n ${seen[$dir]} ]] && continue
+    seen[$dir]=1
+    ordered+=("$dir")
+  done
+
+  if $prioritize; then
+    local install_patt="$DBT_INSTALL_DIR/*"
+    local sourcecode_patt="$DBT_AREA_ROOT/sourcecode/*"
+    local user_patt="$HOME/*"
+    local priority_level1=() priority_level2=() priority_level3=() priority_level4=()
+
+    for dir in "${ordered[@]}"; do
+      if [[ "$dir" == $user_patt && ! "$dir" == $sourcecode_patt && ! "$dir" == $install_patt ]]; then
+        priority_level1+=("$dir")
+      elif [[ "$dir" == $sourcecode_patt ]]; then
+        priority_level2+=("$dir")
+      elif [[ "$dir" == $install_patt ]]; then
+        priority_level3+=("$dir")
+      else
+        priority_level4+=("$dir")
+      fi
+    done
+    ordered=( "${priority_level1[@]}" "${priority_level2[@]}" "${priority_level3[@]}" "${priority_level4[@]}" )
+  fi
+
+  if [[ ${#ordered[@]} -eq 0 ]]; then
+    return 0
+  fi
+
+  local IFS=':'
+  declare -gx "${path_name}=${ordered[*]}"
+
+  echo -e "${COL_BLUE}Added ${#additions[@]} directories -> ${path_name}${COL_RESET}"
+  if [[ $num_missing -gt 0 ]]; then
+    echo -e "${COL_YELLOW}WARNING: ${num_missing} of the directories added to ${path_name} don't exist (yet)${COL_RESET}"
+  fi
+}
+#------------------------------------------------------------------------------
+
+#------------------------------------------------------------------------------
+# Shell variables which change by themselves or describe the shell rather
+# than the environment it's set up with are left out of snapshots
+ENV_SNAPSHOT_IGNORED_VARS_REGEX='^(BASH.*|FUNCNAME|RANDOM|SRANDOM|SECONDS|LINENO|EPOCHSECONDS|EPOCHREALTIME|PIPESTATUS|HISTCMD|_|PWD|OLDPWD|SHLVL|COLUMNS|LINES|DIRSTACK|GROUPS|PPID|UID|EUID|SHELLOPTS|COMP_.*|OPTIND|OPTARG|__dbt_snapshot_.*)$'
+
+# env_snapshot_begin records the shell's variables and functions, and
+# env_snapshot_save <file> then writes a script to <file> which, when
+# sourced, makes the same changes to them as were made in between
+function env_snapshot_begin() {
+    declare -gA __dbt_snapshot_vars=()
+    declare -gA __dbt_snapshot_funcs=()
+    local __dbt_snapshot_name
+    for __dbt_snapshot_name in $(compgen -v); do
+        [[ $__dbt_snapshot_name =~ $ENV_SNAPSHOT_IGNORED_VARS_REGEX ]] && continue
+        __dbt_snapshot_vars[$__dbt_snapshot_name]=$(declare -p $__dbt_snapshot_name 2>/dev/null)
+    done
+    for __dbt_snapshot_name in $(compgen -A function); do
+        __dbt_snapshot_funcs[$__dbt_snapshot_name]=$(declare -f $__dbt_snapshot_name)
+    done
+}
+
+function env_snapshot_save() {
+    local __dbt_snapshot_file=$1
+    local __dbt_snapshot_tmpfile=${__dbt_snapshot_file}.$$.tmp
+    local __dbt_snapshot_name __dbt_snapshot_decl __dbt_snapshot_flags
+
+    mkdir -p $(dirname $__dbt_snapshot_file) 2>/dev/null || return 1
+
+    {
+        echo "# Environment changes saved by dbt-workarea-env on $(date); delete this file to set the environment up from scratch"
+
+        for __dbt_snapshot_name in $(compgen -v); do
+            [[ $__dbt_snapshot_name =~ $ENV_SNAPSHOT_IGNORED_VARS_REGEX ]] && continue
+            __dbt_snapshot_decl=$(declare -p $__dbt_snapshot_name 2>/dev/null) || continue
+            [[ "$__dbt_snapshot_decl" == "${__dbt_snapshot_vars[$__dbt_snapshot_name]}" ]] && continue
+
+            # "declare -x PATH=..." needs to become "declare -gx PATH=...",
+            # since dbt-workarea-env is sourced from within a function
+            __dbt_snapshot_flags=${__dbt_snapshot_decl#declare -}
+            __dbt_snapshot_flags=${__dbt_snapshot_flags%% *}
+            [[ $__dbt_snapshot_flags =~ r ]] && continue
+            echo "declare -g${__dbt_snapshot_flags//-/} ${__dbt_snapshot_decl#declare -$__dbt_snapshot_flags }"
+        done
+        for __dbt_snapshot_name in "${!__dbt_snapshot_vars[@]}"; do
+            declare -p $__dbt_snapshot_name &>/dev/null || echo "unset $__dbt_snapshot_name"
+        done
+
+        for __dbt_snapshot_name in $(compgen -A function); do
+            __dbt_snapshot_decl=$(declare -f $__dbt_snapshot_name)
+            [[ "$__dbt_snapshot_decl" == "${__dbt_snapshot_funcs[$__dbt_snapshot_name]}" ]] || echo "$__dbt_snapshot_decl"
+        done
+        for __dbt_snapshot_name in "${!__dbt_snapshot_funcs[@]}"; do
+            declare -F $__dbt_snapshot_name &>/dev/null || echo "unset -f $__dbt_snapshot_name"
+        done
+    } > $__dbt_snapshot_tmpfile 2>/dev/null && mv $__dbt_snapshot_tmpfile $__dbt_snapshot_file
+
+    local __dbt_snapshot_retval=$?
+    rm -f $__dbt_snapshot_tmpfile
+    unset __dbt_snapshot_vars __dbt_snapshot_funcs
+    return $__dbt_snapshot_retval
+}
+#------------------------------------------------------------------------------
+
 #------------------------------------------------------------------------------
 function remove_path() {
   # Assert that we got enough arguments
@@ -316,7 +461,7 @@ function stack_new_spack() {
 
 #------------------------------------------------------------------------------
 function load_yaml() {
-    python3 -c "import yaml;print(yaml.safe_load(open('$1'))$2)"
+    python3 ${DBT_ROOT}/scripts/dbt_release_data.py ${DBT_AREA_ROOT:+--cache-dir $DBT_AREA_ROOT/$DBT_CACHE_DIR} "$1" "$2"
 }
 #------------------------------------------------------------------------------
 
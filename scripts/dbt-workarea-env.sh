@@ -10,27 +10,34 @@ DBT_PKG_SETS=( devtools systems externals daqpackages )
 DEFAULT_BUILD_TYPE=RelWithDebInfo
 
 # We use "$@" instead of $* to preserve argument-boundary information
-options=$(getopt -o 'hs:' -l 'help, subset:' -- "$@") || return 10
+options=$(getopt -o 'hs:' -l 'help, subset:, no-snapshot' -- "$@") || return 10
 eval "set -- $options"
 
 DBT_PKG_SET="${DBT_PKG_SETS[-1]}"
+use_env_snapshot=true
 while true; do
     case $1 in
 	(-s|--subset)
             DBT_PKG_SET=$2
             shift 2;;
+	(--no-snapshot)
+            use_env_snapshot=false
+            shift;;
         (-h|--help)
             cat << EOU
 Usage
 -----
 
-  ${scriptname} [-h/--help] [-s/--subset [devtools systems externals daqpackages]]
+  ${scriptname} [-h/--help] [-s/--subset [devtools systems externals daqpackages]] [--no-snapshot]
 
   Sets up the environment of a dbt development area
 
   Arguments and options:
 
     -s/--subset: optional set of ups packages to load. [choices: ${DBT_PKG_SETS[@]}] 
+    --no-snapshot: set the environment up from scratch rather than restoring
+                   the one saved in the work area by an earlier call, and
+                   don't save it either
 
     
 EOU
@@ -99,6 +106,47 @@ EOF
     fi
 fi
 
+DBT_PACKAGES=$(find -L ${SOURCE_DIR}/ -mindepth 2 -maxdepth 2 -name CMakeLists.txt | sed "s#${SOURCE_DIR}/\(.*\)/CMakeLists.txt#\1#")
+
+# Everything the environment set up below depends on, including the
+# spack databases of the release and of any local spack; if none of it
+# has changed since the environment was last set up from scratch, the
+# result is the same, so it can be restored from a snapshot instead
+function workarea_env_snapshot_key() {
+    {
+        echo "$DBT_PKG_SET $SPACK_RELEASE $SPACK_RELEASES_DIR $DBT_ROOT ${DBT_INSTALL_DIR:-} ${LOCAL_SPACK_DIR:-} ${SPACK_DISABLE_LOCAL_CONFIG:-}"
+        cat $DBT_AREA_ROOT/dbt-workarea-constants.sh
+        echo $DBT_PACKAGES
+        for var in PATH LD_LIBRARY_PATH PYTHONPATH CET_PLUGIN_PATH DUNEDAQ_SHARE_PATH DUNEDAQ_DB_PATH VIRTUAL_ENV PS1; do
+            echo "$var=${!var}"
+        done
+        stat -c "%n %Y" ${HERE}/dbt-workarea-env.sh ${HERE}/dbt-setup-tools.sh \
+             ${DBT_AREA_ROOT}/${DBT_VENV}/pyvenv.cfg ${DBT_AREA_ROOT}/${DBT_VENV}/bin/activate \
+             ${SPACK_RELEASES_DIR}/${SPACK_RELEASE}/spack-installation/opt/spack/.spack-db/index.json \
+             ${SPACK_RELEASES_DIR}/${SPACK_RELEASE}/default/spack-installation/opt/spack/.spack-db/index.json \
+             ${LOCAL_SPACK_DIR:+$LOCAL_SPACK_DIR/opt/spack/.spack-db/index.json} 2>/dev/null
+    } | sha256sum | cut -c1-16
+}
+
+env_snapshot_file=""
+ENV_SNAPSHOTS_KEPT=5
+if [[ -z "${DBT_PACKAGE_SETUP_DONE}" ]] && $use_env_snapshot; then
+    env_snapshot_file=${DBT_AREA_ROOT}/${DBT_CACHE_DIR}/workarea-env-$(workarea_env_snapshot_key).sh
+
+    if [[ -f $env_snapshot_file ]]; then
+        source $env_snapshot_file
+        mkdir -p $DBT_INSTALL_DIR
+
+        echo -e "${COL_GREEN}Restored the environment saved in ${env_snapshot_file}${COL_RESET}"
+        echo "(use the --no-snapshot option to set it up from scratch instead)"
+        echo
+        echo -e "${COL_GREEN}This script has been sourced successfully${COL_RESET}"
+        echo
+        return 0
+    fi
+
+    env_snapshot_begin
+fi
 
 if [[ -z "${DBT_PACKAGE_SETUP_DONE}" ]]; then
     spack_setup_env
@@ -184,8 +232,11 @@ fi
 echo
 echo -e "${COL_GREEN}Updating paths...${COL_RESET}"
 
-DBT_PACKAGES=$(find -L ${SOURCE_DIR}/ -mindepth 2 -maxdepth 2 -name CMakeLists.txt | sed "s#${SOURCE_DIR}/\(.*\)/CMakeLists.txt#\1#")
-
+bin_dirs=()
+python_dirs=()
+lib_dirs=()
+share_dirs=()
+db_dirs=()
 
 for p in ${DBT_PACKAGES}; do
     PNAME=${p^^}
@@ -194,21 +245,31 @@ for p in ${DBT_PACKAGES}; do
     # Share
     pkg_share="${PNAME//-/_}_SHARE"
     declare -xg "${pkg_share}"="${DBT_INSTALL_DIR}/${p}/share"
-    add_many_paths PATH "${PKG_INSTALL_PATH}/bin" "${PKG_INSTALL_PATH}/test/bin"
-    add_many_paths PYTHONPATH "${PKG_INSTALL_PATH}/lib64/python"
-    add_many_paths LD_LIBRARY_PATH "${PKG_INSTALL_PATH}/lib64"  "${PKG_INSTALL_PATH}/test/lib64"
-    add_many_paths CET_PLUGIN_PATH "${PKG_INSTALL_PATH}/lib64" "${PKG_INSTALL_PATH}/test/lib64"
-    add_many_paths DUNEDAQ_SHARE_PATH  "${PKG_INSTALL_PATH}/share"
-    add_many_paths DUNEDAQ_DB_PATH "${SOURCE_DIR}/$p"
+    bin_dirs+=("${PKG_INSTALL_PATH}/bin" "${PKG_INSTALL_PATH}/test/bin")
+    python_dirs+=("${PKG_INSTALL_PATH}/lib64/python")
+    lib_dirs+=("${PKG_INSTALL_PATH}/lib64" "${PKG_INSTALL_PATH}/test/lib64")
+    share_dirs+=("${PKG_INSTALL_PATH}/share")
+    db_dirs+=("${SOURCE_DIR}/$p")
 done
 
-prioritize_directories DUNEDAQ_DB_PATH
+compose_path PATH "${bin_dirs[@]}"
+compose_path PYTHONPATH "${python_dirs[@]}"
+compose_path LD_LIBRARY_PATH "${lib_dirs[@]}"
+compose_path CET_PLUGIN_PATH "${lib_dirs[@]}"
+compose_path DUNEDAQ_SHARE_PATH "${share_dirs[@]}"
+compose_path -p DUNEDAQ_DB_PATH "${db_dirs[@]}"
 
-export PATH PYTHONPATH LD_LIBRARY_PATH CET_PLUGIN_PATH DUNEDAQ_SHARE_PATH DUNEDAQ_DB_PATH
 echo -e "${COL_GREEN}...done${COL_RESET}"
 echo
 
 export DBT_WORKAREA_ENV_SCRIPT_SOURCED=1
 
+if [[ -n $env_snapshot_file ]]; then
+    # Snapshots of other setups (e.g. another --subset) are kept so that
+    # switching between them still restores, but only the most recent few
+    ls -t ${DBT_AREA_ROOT}/${DBT_CACHE_DIR}/workarea-env-*.sh 2>/dev/null | tail -n +${ENV_SNAPSHOTS_KEPT} | xargs -r rm -f
+    env_snapshot_save $env_snapshot_file || echo -e "${COL_YELLOW}WARNING: unable to save the environment to ${env_snapshot_file}${COL_RESET}"
+fi
+
 echo -e "${COL_GREEN}This script has been sourced successfully${COL_RESET}"
 echo
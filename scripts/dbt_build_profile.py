@@ -0,0 +1,148 @@
+import bisect
+import collections
+import os
+
+NINJA_LOG_HEADER = "# ninja log v"
+
+def ninja_log_size(ninja_log):
+    try:
+        return os.path.getsize(ninja_log)
+    except OSError:
+        return 0
+
+def read_ninja_log(ninja_log, offset=0):
+    """
+    Return the targets ninja built in its most recent run as a list of
+    dicts with the keys "output", "start" and "end" (in seconds since
+    the start of that run).
+
+    OFFSET should be the size of the .ninja_log before the run, so only
+    what the run appended is read. If the log has since been rewritten
+    (ninja occasionally recompacts it) or no offset is given, the most
+    recent run is taken to start where the end times in the log go
+    backwards, since each run's times start from zero.
+    """
+
+    with open(ninja_log) as f:
+        if 0 < offset <= os.fstat(f.fileno()).st_size:
+            f.seek(offset)
+            lines = f.readlines()
+        else:
+            lines = f.readlines()
+            previous_end = None
+            for i in reversed(range(len(lines))):
+                fields = lines[i].split("\t")
+                if lines[i].startswith(NINJA_LOG_HEADER) or len(fields) < 4:
+                    lines = lines[i + 1:]
+                    break
+                if previous_end is not None and int(fields[1]) > previous_end:
+                    lines = lines[i + 1:]
+                    break
+                previous_end = int(fields[1])
+
+    # A target which shows up more than once was rebuilt, e.g. because
+    # a restat rule ran again; the last entry is the one that counts
+    targets = {}
+    for line in lines:
+        fields = line.rstrip("\n").split("\t")
+        if line.startswith("#") or len(fields) < 4:
+            continue
+        targets[fields[3]] = { "output": fields[3], "start": int(fields[0]) / 1000, "end": int(fields[1]) / 1000 }
+
+    return sorted(targets.values(), key=lambda target: (target["start"], target["end"]))
+
+def package_of(output, packages):
+    pkg = output.split("/")[0]
+    return pkg if pkg in packages else "(top level)"
+
+def critical_path(targets):
+    """
+    Estimate the critical path of a build from its timeline alone: the
+    ninja log doesn't record dependencies, so starting from the target
+    which finished last, each target is assumed to have been waiting on
+    whichever target finished most recently before it started.
+    """
+
+    if not targets:
+        return []
+
+    by_end = sorted(targets, key=lambda target: target["end"])
+    ends = [target["end"] for target in by_end]
+
+    i = len(by_end) - 1
+    path = []
+    while i >= 0:
+        path.append(by_end[i])
+        i = min(bisect.bisect_right(ends, by_end[i]["start"]), i) - 1
+
+    return list(reversed(path))
+
+def profile_build(targets, packages, n_jobs=None, num_slowest=20):
+    "Summarize the targets of a build as returned by read_ninja_log"
+
+    for target in targets:
+        target["duration"] = target["end"] - target["start"]
+        target["package"] = package_of(target["output"], packages)
+
+    wall_time = max([target["end"] for target in targets], default=0) - min([target["start"] for target in targets], default=0)
+    total_time = sum(target["duration"] for target in targets)
+
+    per_package = collections.defaultdict(lambda: { "targets": 0, "total_time_s": 0.0 })
+    for target in targets:
+        per_package[target["package"]]["targets"] += 1
+        per_package[target["package"]]["total_time_s"] += target["duration"]
+
+    def target_summary(target):
+        return { "output": target["output"],
+                 "package": target["package"],
+                 "start_s": round(target["start"], 3),
+                 "duration_s": round(target["duration"], 3) }
+
+    slowest = sorted(targets, key=lambda target: target["duration"], reverse=True)[:num_slowest]
+    path = critical_path(targets)
+
+    return { "num_targets": len(targets),
+             "jobs": n_jobs,
+             "wall_time_s": round(wall_time, 3),
+             "total_target_time_s": round(total_time, 3),
+             "achieved_parallelism": round(total_time / wall_time, 2) if wall_time > 0 else None,
+             "packages": { pkg: { "targets": info["targets"], "total_time_s": round(info["total_time_s"], 3) }
+                           for pkg, info in sorted(per_package.items(), key=lambda item: item[1]["total_time_s"], reverse=True) },
+             "slowest_targets": [target_summary(target) for target in slowest],
+             "critical_path": { "duration_s": round(sum(target["duration"] for target in path), 3),
+                                "targets": [target_summary(target) for target in path] } }
+
+def format_package_times(profile, num_packages=None):
+    "Return the time spent per package in a profile returned by profile_build, one line per package"
+
+    return "\n".join(f"    {info['total_time_s']:8.2f} s  {pkg} ({info['targets']} targets)"
+                     for pkg, info in list(profile["packages"].items())[:num_packages])
+
+def format_profile(profile, num_targets=10, num_packages=20):
+    "Return a human-readable report of a profile returned by profile_build"
+
+    lines = []
+    lines.append(f"Build profile ({profile['num_targets']} targets built):")
+
+    parallelism = profile["achieved_parallelism"]
+    if parallelism is not None:
+        jobs = f" with -j {profile['jobs']}" if profile["jobs"] else ""
+        lines.append(f"  achieved parallelism {parallelism:.2f}{jobs} "
+                     f"({profile['total_target_time_s']:.1f} s of work in {profile['wall_time_s']:.1f} s)")
+
+    lines.append("")
+    lines.append("  Slowest targets:")
+    for target in profile["slowest_targets"][:num_targets]:
+        lines.append(f"    {target['duration_s']:8.2f} s  {target['output']}")
+
+    lines.append("")
+    lines.append("  Time spent per package:")
+    lines.append(format_package_times(profile, num_packages))
+
+    critical_path = profile["critical_path"]
+    lines.append("")
+    lines.append(f"  Estimated critical path: {critical_path['duration_s']:.2f} s over {len(critical_path['targets'])} targets")
+    for target in critical_path["targets"]:
+        lines.append(f"    {target['duration_s']:8.2f} s  {target['output']}")
+
+    return "\n".join(lines)
@@ -0,0 +1,103 @@
+import json
+import os
+import re
+import shutil
+import subprocess
+
+LAUNCHERS = ["ccache", "sccache"]
+
+# Set to "auto", "ccache" or "sccache" to have dbt-build use a compiler
+# cache without passing --compiler-cache; "0" or "" turns it off
+COMPILER_CACHE_ENV_VAR = "DBT_COMPILER_CACHE"
+COMPILER_CACHE_DIR_ENV_VAR = "DBT_COMPILER_CACHE_DIR"
+
+LANGUAGES = ["C", "CXX"]
+
+def find_launcher(requested="auto"):
+    """
+    Return the full path of the compiler cache REQUESTED ("ccache",
+    "sccache", or "auto" for whichever of them is found first in PATH,
+    which is where loading devtools puts them), or None if it can't be
+    found
+    """
+    candidates = LAUNCHERS if requested == "auto" else [requested]
+    for candidate in candidates:
+        path = shutil.which(candidate)
+        if path:
+            return path
+    return None
+
+def configured_launcher(cmake_cache):
+    "Return the compiler launcher a build directory was configured with, if any, from its CMakeCache.txt"
+    try:
+        with open(cmake_cache) as f:
+            for line in f:
+                match = re.match(r"CMAKE_CXX_COMPILER_LAUNCHER:[A-Z]+=(.*)", line)
+                if match:
+                    return match.group(1).strip() or None
+    except OSError:
+        pass
+    return None
+
+def default_cache_dir(launcher):
+    """
+    Return the directory to keep the cache in. By default it's the same
+    for every work area based on the same release, so e.g. a clean build
+    in a fresh work area reuses what a build in another one compiled
+    """
+    if os.environ.get(COMPILER_CACHE_DIR_ENV_VAR):
+        return os.environ[COMPILER_CACHE_DIR_ENV_VAR]
+    release = os.environ.get("SPACK_RELEASE", "no-release")
+    return os.path.join(os.path.expanduser("~"), ".cache", "dbt", os.path.basename(launcher), release)
+
+def cmake_arguments(launcher):
+    return [f"-DCMAKE_{lang}_COMPILER_LAUNCHER={launcher}" for lang in LANGUAGES]
+
+def environment(launcher, cache_dir, base_dir):
+    """
+    Return the environment variables the compiler cache needs while
+    building. For ccache the work area is made the base directory, so
+    that paths inside it are hashed relative to it and the same sources
+    in a different work area still hit in the cache
+    """
+    if os.path.basename(launcher) == "sccache":
+        return { "SCCACHE_DIR": cache_dir }
+    return { "CCACHE_DIR": cache_dir,
+             "CCACHE_BASEDIR": base_dir,
+             "CCACHE_NOHASHDIR": "true" }
+
+def read_stats(launcher, env):
+    """
+    Return the compiler cache's cumulative statistics as a dict with the
+    keys "hits" and "misses", or None if they can't be obtained
+    """
+    env = dict(os.environ, **env)
+    try:
+        if os.path.basename(launcher) == "sccache":
+            output = subprocess.run([launcher, "--show-stats", "--stats-format=json"], env=env,
+                                    stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, check=True).stdout
+            stats = json.loads(output)["stats"]
+            return { "hits": sum(stats["cache_hits"]["counts"].values()),
+                     "misses": sum(stats["cache_misses"]["counts"].values()) }
+
+        output = subprocess.run([launcher, "--print-stats"], env=env, universal_newlines=True,
+                                stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, check=True).stdout
+        stats = dict(line.split("\t", 1) for line in output.splitlines() if "\t" in line)
+        return { "hits": int(stats.get("direct_cache_hit", 0)) + int(stats.get("preprocessed_cache_hit", 0)),
+                 "misses": int(stats.get("cache_miss", 0)) }
+    except (OSError, subprocess.CalledProcessError, KeyError, ValueError, AttributeError):
+        return None
+
+def stats_difference(before, after):
+    """
+    Return what happened to the cache between two calls to read_stats.
+    The statistics belong to the whole cache, so if other builds share
+    it at the same time their compilations get counted as well
+    """
+    if before is None or after is None:
+        return None
+    hits = after["hits"] - before["hits"]
+    misses = after["misses"] - before["misses"]
+    return { "hits": hits,
+             "misses": misses,
+             "hit_rate": round(hits / (hits + misses), 3) if hits + misses > 0 else None }
@@ -3,16 +3,17 @@ DBT_ROOT=os.environ["DBT_ROOT"]
 exec(open(f'{DBT_ROOT}/scripts/dbt_setup_constants.py').read())
 
 import argparse
+import json
 import pathlib
 from shutil import copy
 import subprocess
 import sys
-from time import sleep
+from time import monotonic, sleep
 
 
 sys.path.append(f'{DBT_ROOT}/scripts')
 
-from dbt_setup_tools import error, get_time, list_releases, run_command
+from dbt_setup_tools import error, get_time, list_releases, run_command, timed_phase
 
 PY_PKGLIST="pyvenv_requirements.txt"
 DAQ_BUILDORDER_PKGLIST="dbt-build-order.cmake"
@@ -24,7 +25,7 @@ Usage
 
 To create a new DUNE DAQ development area:
 
-    {os.path.basename(__file__)} [-n/--nightly] [-b/--base-release <base release type>]  [-r/--release-path <path to release area>] [-i/--install-pyvenv] <DAQ release> (target directory)
+    {os.path.basename(__file__)} [-n/--nightly] [-b/--base-release <base release type>]  [-r/--release-path <path to release area>] [-i/--install-pyvenv] [-c/--venv-cache] [-t/--timing] <DAQ release> (target directory)
 
 To list the available DUNE DAQ releases:
 
@@ -50,7 +51,14 @@ Arguments and options:
     -q/--quick: if not doing Python development, skip cloning the python
                          virtual environment from the default venv in the
                          release's directory on cvmfs
+    -c/--venv-cache: clone the python virtual environment by way of a cache
+                         shared by all work areas (in ~/.cache/dbt/venvs unless
+                         $DBT_VENV_CACHE_DIR says otherwise), which is much faster
+                         once the release's venv is in it; same as setting
+                         DBT_VENV_CACHE=1
     -s/--spack: install a local spack instance in the workarea
+    -t/--timing: print how long each phase of the work area creation took;
+                         the timings are always saved in log/dbt_create_timing.json
 
 See https://dune-daq-sw.readthedocs.io/en/latest/packages/daq-buildtools for more
 
@@ -65,7 +73,9 @@ parser.add_argument("-l", "--list", action="store_true", dest='_list', help=argp
 parser.add_argument("-i", "--install-pyvenv", action="store_true", dest='install_pyvenv', help=argparse.SUPPRESS)
 parser.add_argument("-p", "--pyvenv-requirements", action='store', dest='pyvenv_requirements', help=argparse.SUPPRESS)
 parser.add_argument("-q", "--quick", action="store_true", dest='quick', help=argparse.SUPPRESS)
+parser.add_argument("-c", "--venv-cache", action="store_true", dest='venv_cache', help=argparse.SUPPRESS)
 parser.add_argument("-s", "--spack", action="store_true", dest='install_spack', help=argparse.SUPPRESS)
+parser.add_argument("-t", "--timing", action="store_true", dest='timing', help=argparse.SUPPRESS)
 parser.add_argument("release_tag", nargs='?', help=argparse.SUPPRESS)
 parser.add_argument("workarea_dir", nargs='?', help=argparse.SUPPRESS)
 
@@ -77,6 +87,12 @@ You supplied the name of a Python requirements file but therefore also need
 to add --install-pyvenv as an argument
 """)
 
+if args.venv_cache and (args.quick or args.install_pyvenv):
+    error("""
+The -c/--venv-cache option only applies when the python virtual environment
+is cloned, so it can't be combined with -q/--quick or -i/--install-pyvenv
+""")
+
 if args.quick and args.install_pyvenv:
     error("""
 Use of the -q/--quick option means you don't want a local Python environment and
@@ -139,30 +155,35 @@ from a clean shell. Exiting...
 )
 
 starttime_d=get_time("as_date")
-starttime_s=get_time("as_seconds_since_epoch")
+starttime_s=monotonic()
+
+# How long each phase of the work area creation takes, in seconds
+timings={}
 
-try:
-    pathlib.Path(TARGETDIR).mkdir(parents=True)
-except PermissionError:
-    error(f"You don't have permission to create {TARGETDIR} from {os.getcwd()}. Exiting...")
+with timed_phase(timings, "create directories"):
+    try:
+        pathlib.Path(TARGETDIR).mkdir(parents=True)
+    except PermissionError:
+        error(f"You don't have permission to create {TARGETDIR} from {os.getcwd()}. Exiting...")
 
-os.chdir(TARGETDIR)
-TARGETDIR=os.getcwd() # Get full path
+    os.chdir(TARGETDIR)
+    TARGETDIR=os.getcwd() # Get full path
 
-BUILDDIR=f"{TARGETDIR}/build"
-LOGDIR=f"{TARGETDIR}/log"
-SRCDIR=f"{TARGETDIR}/sourcecode"
+    BUILDDIR=f"{TARGETDIR}/build"
+    LOGDIR=f"{TARGETDIR}/log"
+    SRCDIR=f"{TARGETDIR}/sourcecode"
 
-for workareadir in [BUILDDIR, LOGDIR, SRCDIR]:
-    os.mkdir(workareadir)
+    for workareadir in [BUILDDIR, LOGDIR, SRCDIR]:
+        os.mkdir(workareadir)
 
 os.chdir(SRCDIR)
 
-for dbtfile in [f"{DBT_ROOT}/configs/CMakeLists.txt", \
-                f"{DBT_ROOT}/configs/CMakeGraphVizOptions.cmake", \
-                f"{RELEASE_PATH}/{DAQ_BUILDORDER_PKGLIST}"
-                ]:
-    copy(dbtfile, SRCDIR)
+with timed_phase(timings, "copy build order and CMake files"):
+    for dbtfile in [f"{DBT_ROOT}/configs/CMakeLists.txt", \
+                    f"{DBT_ROOT}/configs/CMakeGraphVizOptions.cmake", \
+                    f"{RELEASE_PATH}/{DAQ_BUILDORDER_PKGLIST}"
+                    ]:
+        copy(dbtfile, SRCDIR)
 
 # os.symlink(f"{DBT_ROOT}/env.sh", f"{TARGETDIR}/dbt-env.sh")
 env_script_content = f'''
@@ -176,6 +197,8 @@ with open(f'{TARGETDIR}/env.sh', "w") as outf:
 # Set these so the dbt-clone-pyvenv.sh and dbt-create-pyvenv.sh scripts get info they need
 os.environ["SPACK_RELEASE"] = f"{RELEASE}"
 os.environ["SPACK_RELEASES_DIR"] = f"{RELEASE_BASEPATH}"
+if args.venv_cache:
+    os.environ["DBT_VENV_CACHE"] = "1"
 
 workarea_constants_file_contents = \
     f"""export SPACK_RELEASE="{os.environ["SPACK_RELEASE"]}"
@@ -201,9 +224,12 @@ with open(f'{TARGETDIR}/dbt-workarea-constants.sh', "w") as outf:
 
 if args.install_spack:
     # create local spack instance here.
-    run_command(f"{DBT_ROOT}/scripts/dbt-create-spack.sh 2>&1")
+    with timed_phase(timings, "create local spack instance"):
+        run_command(f"{DBT_ROOT}/scripts/dbt-create-spack.sh 2>&1")
 
+pyvenv_phase = None
 if args.install_pyvenv:
+    pyvenv_phase = "install python venv"
     print("Setting up the Python subsystem.")
     print("Please be patient, this should take O(1 minute)...")
     if not args.pyvenv_requirements:
@@ -216,6 +242,7 @@ Please note you need to provide its absolute path. Exiting...
 """)
         cmd = f"{DBT_ROOT}/scripts/dbt-create-pyvenv.sh {args.pyvenv_requirements} 2>&1"
 elif not args.quick:
+    pyvenv_phase = "clone python venv"
     print("Setting up the Python subsystem.")
     cmd = f"{DBT_ROOT}/scripts/dbt-clone-pyvenv.sh {RELEASE_PATH}/{DBT_VENV} 2>&1"
 else:
@@ -223,13 +250,31 @@ else:
     print("Skipping the creation of python virtual environment in the workarea.")
     print(f"Default python venv under {RELEASE_PATH}/.venv will be used.")
 
-run_command(cmd)
+if pyvenv_phase is not None:
+    with timed_phase(timings, pyvenv_phase):
+        run_command(cmd)
+else:
+    run_command(cmd)
 
 endtime_d=get_time("as_date")
-endtime_s=get_time("as_seconds_since_epoch")
+endtime_s=monotonic()
+
+timing_info = { "release": RELEASE,
+                "start_time": starttime_d,
+                "end_time": endtime_d,
+                "total_s": round(endtime_s - starttime_s, 3),
+                "phases": { phase: round(seconds, 3) for phase, seconds in timings.items() } }
+
+with open(f"{LOGDIR}/dbt_create_timing.json", "w") as outf:
+    json.dump(timing_info, outf, indent=4)
+
+if args.timing:
+    print("\nTime taken by each phase:")
+    for phase, seconds in timings.items():
+        print(f"    {phase:<40}{seconds:8.2f} s")
 
 print(f"""
-Total time to run {__file__}: {int(endtime_s) - int(starttime_s)} seconds
+Total time to run {__file__}: {endtime_s - starttime_s:.1f} seconds
 Start time: {starttime_d}
 End time:   {endtime_d}
 
@@ -0,0 +1,102 @@
+import collections
+import json
+import os
+import re
+
+# gcc/clang diagnostics look like
+# /path/to/File.cpp:12:34: warning: unused variable 'x' [-Wunused-variable]
+# possibly with color codes sprinkled in, which are removed before matching
+DIAGNOSTIC_MARKER_REGEX = re.compile(rb"(?:warning|error): ")
+DIAGNOSTIC_REGEX = re.compile(rb"^(?P<file>[^\s:][^:]*):(?P<line>\d+):(?:(?P<column>\d+):)? (?:fatal )?(?P<kind>warning|error): (?P<message>.*?)(?: \[(?P<flag>-W[^\]]+)\])?\s*$")
+COLOR_CODE_REGEX = re.compile(rb"\x1b\[[0-9;]*[mK]")
+
+class DiagnosticsIndexer:
+    """
+    Picks out compiler warnings and errors from build output as it's
+    written to the build log, and records each of them as a line of
+    JSON in INDEX_FILE: the package the offending file belongs to, the
+    file, line and column, whether it's a warning or an error, the flag
+    which triggered it (e.g. "-Wunused-variable") and the byte offset in
+    the log of the line with the diagnostic.
+
+    Files are attributed to packages by whether they're in SRCDIR/<pkg>
+    or BUILDDIR/<pkg>; relative paths are taken relative to BUILDDIR,
+    which is where the compiler is run from.
+    """
+
+    def __init__(self, index_file, srcdir, builddir):
+        self.index_file = index_file
+        self.srcdir = os.path.normpath(srcdir)
+        self.builddir = os.path.normpath(builddir)
+        self.indexfile = open(index_file, "a")
+        self.tail = b""
+        self.tail_offset = 0
+        self.counts = collections.Counter()
+        self.warnings_per_package = collections.Counter()
+        self.warnings_per_flag = collections.Counter()
+
+    def feed(self, data, offset):
+        "Index DATA, which was written to the build log starting at byte OFFSET"
+
+        if self.tail:
+            data = self.tail + data
+            offset = self.tail_offset
+
+        # Only complete lines are indexed; the rest waits for the next chunk
+        end_of_complete_lines = data.rfind(b"\n") + 1
+        self.tail = data[end_of_complete_lines:]
+        self.tail_offset = offset + end_of_complete_lines
+
+        self._index_lines(data, 0, end_of_complete_lines, offset)
+
+    def flush(self):
+        if self.tail:
+            self._index_lines(self.tail, 0, len(self.tail), self.tail_offset)
+            self.tail = b""
+        self.indexfile.flush()
+
+    def close(self):
+        self.flush()
+        self.indexfile.close()
+
+    def package_of(self, filename):
+        path = os.path.normpath(os.path.join(self.builddir, filename))
+        for basedir in [self.srcdir, self.builddir]:
+            if path.startswith(basedir + os.sep):
+                return path[len(basedir) + 1:].split(os.sep)[0]
+        return None
+
+    def _index_lines(self, data, start, end, offset):
+        previous_line_start = -1
+        for marker in DIAGNOSTIC_MARKER_REGEX.finditer(data, start, end):
+            line_start = data.rfind(b"\n", start, marker.start()) + 1
+            if line_start == previous_line_start:
+                continue
+            previous_line_start = line_start
+
+            line_end = data.find(b"\n", marker.end(), end)
+            if line_end == -1:
+                line_end = end
+
+            res = DIAGNOSTIC_REGEX.match(COLOR_CODE_REGEX.sub(b"", data[line_start:line_end]))
+            if res is None:
+                continue
+
+            filename = res.group("file").decode("utf-8", errors="replace")
+            kind = res.group("kind").decode("utf-8")
+            flag = res.group("flag").decode("utf-8") if res.group("flag") else None
+            package = self.package_of(filename)
+
+            record = { "package": package,
+                       "file": filename,
+                       "line": int(res.group("line")),
+                       "column": int(res.group("column")) if res.group("column") else None,
+                       "kind": kind,
+                       "flag": flag,
+                       "offset": offset + line_start }
+            self.indexfile.write(json.dumps(record) + "\n")
+
+            self.counts[kind] += 1
+            if kind == "warning":
+                self.warnings_per_package[package] += 1
+                self.warnings_per_flag[flag] += 1
@@ -0,0 +1,118 @@
+import concurrent.futures
+import hashlib
+import json
+import os
+import stat
+
+# Walking cvmfs is mostly waiting on catalog and metadata lookups, so
+# this is deliberately more threads than there are cores
+DEFAULT_JOBS = 32
+
+def _scan_dir(path):
+    """
+    Return what's directly in the directory PATH: the bytes taken up by
+    its files, how many there are, its subdirectories along with the
+    bytes each of them takes up itself, and the
+    (device, inode, bytes) of files with more than one hardlink, which
+    the caller has to count only once
+    """
+    nbytes = 0
+    nfiles = 0
+    subdirs = []
+    hardlinked = []
+    try:
+        with os.scandir(path) as entries:
+            for entry in entries:
+                try:
+                    st = entry.stat(follow_symlinks=False)
+                except OSError:
+                    continue
+                if stat.S_ISDIR(st.st_mode):
+                    subdirs.append((entry.path, st.st_blocks * 512))
+                elif st.st_nlink > 1:
+                    hardlinked.append((st.st_dev, st.st_ino, st.st_blocks * 512))
+                    nfiles += 1
+                else:
+                    nbytes += st.st_blocks * 512
+                    nfiles += 1
+    except OSError:
+        pass
+    return nbytes, nfiles, subdirs, hardlinked
+
+def scan(root, package_prefixes=None, n_jobs=DEFAULT_JOBS):
+    """
+    Add up the disk usage under ROOT the way "du -s" does, but scanning
+    directories on a pool of N_JOBS threads.
+
+    PACKAGE_PREFIXES optionally maps installation directories under ROOT
+    to package names, in which case the usage under each of them is
+    also reported per package.
+
+    Returns a dict with the keys "bytes", "files" and "packages".
+    """
+    package_prefixes = { os.path.normpath(prefix): name for prefix, name in (package_prefixes or {}).items() }
+    seen_inodes = set()
+    total_files = 0
+    packages = {}
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, n_jobs)) as executor:
+        root = os.path.normpath(root)
+        pending = { executor.submit(_scan_dir, root): package_prefixes.get(root) }
+        total_bytes = os.lstat(root).st_blocks * 512
+        if package_prefixes.get(root) is not None:
+            packages[package_prefixes[root]] = total_bytes
+        while pending:
+            done, _ = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                package = pending.pop(future)
+                nbytes, nfiles, subdirs, hardlinked = future.result()
+
+                for dev, ino, size in hardlinked:
+                    if (dev, ino) not in seen_inodes:
+                        seen_inodes.add((dev, ino))
+                        nbytes += size
+
+                total_bytes += nbytes
+                total_files += nfiles
+                if package is not None:
+                    packages[package] = packages.get(package, 0) + nbytes
+
+                for subdir, subdir_bytes in subdirs:
+                    subdir_package = package_prefixes.get(subdir, package)
+                    total_bytes += subdir_bytes
+                    if subdir_package is not None:
+                        packages[subdir_package] = packages.get(subdir_package, 0) + subdir_bytes
+                    pending[executor.submit(_scan_dir, subdir)] = subdir_package
+
+    return { "bytes": total_bytes, "files": total_files, "packages": packages }
+
+def cached_scan(root, cache_dir, package_prefixes=None, n_jobs=DEFAULT_JOBS, refresh=False):
+    """
+    Like scan(), but keeping the result in CACHE_DIR. Only trees in
+    /cvmfs are cached, since a published release there never changes.
+    """
+    if cache_dir is None or not os.path.realpath(root).startswith("/cvmfs/"):
+        return scan(root, package_prefixes, n_jobs)
+
+    key = json.dumps([os.path.realpath(root), sorted((package_prefixes or {}).items())])
+    cache_file = os.path.join(cache_dir, "disk_usage", hashlib.sha256(key.encode("utf-8")).hexdigest()[:16] + ".json")
+
+    if not refresh:
+        try:
+            with open(cache_file) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            pass
+
+    result = scan(root, package_prefixes, n_jobs)
+
+    try:
+        os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+        tmpfile = f"{cache_file}.{os.getpid()}.tmp"
+        with open(tmpfile, "w") as f:
+            json.dump(result, f)
+        os.replace(tmpfile, cache_file)
+    except OSError:
+        pass
+
+    return result
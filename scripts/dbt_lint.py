@@ -0,0 +1,116 @@
+import concurrent.futures
+import hashlib
+import json
+import os
+import subprocess
+
+STYLEGUIDE_DIR_ENV_VAR = "DBT_STYLEGUIDE_DIR"
+STYLE_CHECK_SCRIPT = "cpplint/dune-cpp-style-check.sh"
+
+EXTENSIONS = (".cpp", ".cxx", ".hpp", ".hxx")
+
+def find_styleguide(basedir, dbt_root):
+    """
+    Return the first styleguide directory found among $DBT_STYLEGUIDE_DIR,
+    the work area's "styleguide" directory and the one next to
+    daq-buildtools, or None if there isn't any. Nothing is downloaded,
+    so linting works without network access
+    """
+    candidates = [os.environ.get(STYLEGUIDE_DIR_ENV_VAR), f"{basedir}/styleguide", f"{dbt_root}/styleguide"]
+    for candidate in candidates:
+        if candidate and os.path.exists(os.path.join(candidate, STYLE_CHECK_SCRIPT)):
+            return os.path.realpath(candidate)
+    return None
+
+def styleguide_version(styleguide_dir):
+    "Return a hash of the contents of the styleguide's linting tools, which stands in for its version"
+
+    sha = hashlib.sha256()
+    for dirpath, dirnames, filenames in os.walk(os.path.join(styleguide_dir, os.path.dirname(STYLE_CHECK_SCRIPT))):
+        dirnames.sort()
+        for filename in sorted(filenames):
+            path = os.path.join(dirpath, filename)
+            sha.update(os.path.relpath(path, styleguide_dir).encode("utf-8"))
+            with open(path, "rb") as f:
+                sha.update(f.read())
+    return sha.hexdigest()
+
+def find_files_to_lint(path):
+    "Return the C++ files in PATH (a file, or a directory to search) in a stable order"
+
+    if not os.path.isdir(path):
+        return [path]
+
+    files = []
+    for dirpath, dirnames, filenames in os.walk(path, followlinks=True):
+        dirnames[:] = sorted(d for d in dirnames if not d.startswith("."))
+        files.extend(os.path.join(dirpath, filename) for filename in sorted(filenames) if filename.endswith(EXTENSIONS))
+    return files
+
+def file_hash(path):
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+def load_results(results_file):
+    try:
+        with open(results_file) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_results(results_file, results):
+    os.makedirs(os.path.dirname(results_file), exist_ok=True)
+    tmpfile = f"{results_file}.tmp"
+    with open(tmpfile, "w") as f:
+        json.dump(results, f, sort_keys=True, indent=4)
+    os.replace(tmpfile, results_file)
+
+def lint_files(files, styleguide_dir, builddir, n_jobs, results_file=None, cwd=None, report=None):
+    """
+    Run the styleguide's style check on each of FILES separately, on a
+    pool of N_JOBS workers.
+
+    If RESULTS_FILE is given, each file's result is recorded there along
+    with the hash of the file and of the styleguide, and reused instead
+    of checking the file again for as long as neither changes. REPORT,
+    if given, is called with each file and its result as it finishes.
+
+    Returns a dict mapping each file to a dict with the keys "retval",
+    "output" and "cached"
+    """
+    script = os.path.join(styleguide_dir, STYLE_CHECK_SCRIPT)
+    version = styleguide_version(styleguide_dir)
+    cached_results = load_results(results_file) if results_file else {}
+
+    def lint(filename):
+        key = os.path.realpath(os.path.join(cwd or os.getcwd(), filename))
+        try:
+            digest = file_hash(key)
+        except OSError as e:
+            # E.g. a dangling symlink under sourcecode/
+            return key, { "retval": 1, "output": f"Unable to read {filename}: {e.strerror}\n", "cached": False }, None
+        cached = cached_results.get(key)
+        if cached and cached["hash"] == digest and cached["styleguide"] == version:
+            return key, { "retval": 0, "output": cached["output"], "cached": True }, digest
+
+        proc = subprocess.run([script, builddir, filename], cwd=cwd, stdin=subprocess.DEVNULL,
+                              stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        return key, { "retval": proc.returncode, "output": proc.stdout.decode("utf-8", errors="replace"), "cached": False }, digest
+
+    results = {}
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, n_jobs)) as executor:
+        futures = {executor.submit(lint, filename): filename for filename in files}
+        for future in concurrent.futures.as_completed(futures):
+            filename = futures[future]
+            key, result, digest = future.result()
+            results[filename] = result
+            # Only runs which worked are worth remembering
+            if result["retval"] == 0 and not result["cached"]:
+                cached_results[key] = { "hash": digest, "styleguide": version, "output": result["output"] }
+            if report:
+                report(filename, result)
+
+    if results_file:
+        save_results(results_file, cached_results)
+
+    return results
@@ -0,0 +1,141 @@
+import argparse
+import glob
+import hashlib
+import json
+import os
+import subprocess
+
+TARGET_DIRS_CACHE = "target_dirs.json"
+
+_target_dirs = {}
+_target_dir_errors = {}
+
+def _yaml_loader():
+    # yaml is only imported once a YAML file actually needs parsing, as
+    # when it's been parsed before the cached JSON is all that's needed.
+    # libyaml's loader is an order of magnitude faster than the pure
+    # Python one, but not every python has been built with it
+    import yaml
+    return yaml, getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+def __getattr__(name):
+    if name == "YamlLoader":
+        return _yaml_loader()[1]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def _read_json(filename):
+    try:
+        with open(filename) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def _write_json(filename, data):
+    # The cache is only an optimization, so a work area we can't write to
+    # (someone else's, or one on a read-only filesystem) just goes without
+    tmpfile = f"{filename}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        with open(tmpfile, "w") as f:
+            json.dump(data, f)
+        os.replace(tmpfile, filename)
+    except (OSError, TypeError, ValueError):
+        try:
+            os.unlink(tmpfile)
+        except OSError:
+            pass
+
+def _survives_json(data):
+    try:
+        return json.loads(json.dumps(data)) == data
+    except (TypeError, ValueError):
+        return False
+
+def load_yaml(filename, cache_dir=None):
+    """
+    Return the parsed contents of the YAML file FILENAME. If CACHE_DIR is
+    given, the result is kept there as JSON and reused until the file's
+    mtime or size changes. Contents which wouldn't survive the trip
+    through JSON unchanged (e.g. dates, or maps with integer keys)
+    aren't cached, so the result is the same either way.
+    """
+    if cache_dir is None:
+        yaml, loader = _yaml_loader()
+        with open(filename) as f:
+            return yaml.load(f, Loader=loader)
+
+    path = os.path.realpath(filename)
+    st = os.stat(path)
+    cache_file = os.path.join(cache_dir, "yaml", hashlib.sha256(path.encode("utf-8")).hexdigest()[:16] + ".json")
+
+    cached = _read_json(cache_file)
+    if cached and cached.get("path") == path and cached.get("mtime_ns") == st.st_mtime_ns and cached.get("size") == st.st_size:
+        return cached["data"]
+
+    yaml, loader = _yaml_loader()
+    with open(path) as f:
+        data = yaml.load(f, Loader=loader)
+    if _survives_json(data):
+        _write_json(cache_file, { "path": path, "mtime_ns": st.st_mtime_ns, "size": st.st_size, "data": data })
+    return data
+
+def get_target_dir(package, cache_dir=None):
+    """
+    Return the directory two levels above where Spack installed PACKAGE,
+    i.e. where its release's YAML file is. Asking Spack takes seconds, so
+    the answer is remembered for the rest of the process and, if
+    CACHE_DIR is given, for as long as the same Spack release is loaded.
+    """
+    key = f"{os.environ.get('SPACK_ROOT')}:{os.environ.get('SPACK_RELEASES_DIR')}:{os.environ.get('SPACK_RELEASE')}:{package}"
+    if key in _target_dirs:
+        return _target_dirs[key]
+    # Callers try e.g. "coredaq" and then "dunedaq", so failing is normal
+    # and failing fast the second time around matters too
+    assert key not in _target_dir_errors, _target_dir_errors.get(key)
+
+    cache_file = os.path.join(cache_dir, TARGET_DIRS_CACHE) if cache_dir else None
+    cached = (_read_json(cache_file) if cache_file else None) or {}
+    if key in cached and os.path.isdir(cached[key]):
+        _target_dirs[key] = cached[key]
+        return cached[key]
+
+    res = subprocess.Popen(f"realpath $(spack location -p {package})/../..",
+                           shell=True, stdout=subprocess.PIPE,
+                           stderr=subprocess.PIPE)
+    stdout, stderr = res.communicate()
+
+    errlines = stderr.decode("utf-8").splitlines()
+    if len(errlines) != 0:
+        _target_dir_errors[key] = "".join(errlines)
+    assert len(errlines) == 0, "".join(errlines)
+
+    target_dir = stdout.decode("utf-8").splitlines()[0].rstrip()
+    _target_dirs[key] = target_dir
+
+    if cache_file:
+        cached = _read_json(cache_file) or {}
+        cached[key] = target_dir
+        _write_json(cache_file, cached)
+
+    return target_dir
+
+def get_release_data(package, cache_dir=None):
+    "Return the parsed YAML file describing the release PACKAGE belongs to"
+
+    target_dir = get_target_dir(package, cache_dir)
+
+    yamlfiles = [filename for filename in glob.glob(f"{target_dir}/*.yaml") if os.path.basename(filename) != "repo.yaml"]
+
+    assert len(yamlfiles) == 1, f"Unable to find expected yaml file in {target_dir}"
+    return load_yaml(yamlfiles[0], cache_dir)
+
+if __name__ == "__main__":
+    # Used by load_yaml in dbt-setup-tools.sh
+    parser = argparse.ArgumentParser(description="Print the contents of a YAML file, or part of them")
+    parser.add_argument("-c", "--cache-dir", default=None, help="directory to cache the parsed file in")
+    parser.add_argument("filename", help="the YAML file")
+    parser.add_argument("subscript", nargs="?", default="", help="python subscript to apply to the contents, e.g. '[\"release\"]'")
+    args = parser.parse_args()
+
+    data = load_yaml(args.filename, args.cache_dir)
+    print(eval("data" + args.subscript, {"data": data}))
@@ -1,6 +1,7 @@
 
+import contextlib
 import glob
-from inspect import currentframe, getframeinfo
+import importlib.util
 import os
 import re
 import subprocess
@@ -12,15 +13,58 @@ exec(open(f'{os.environ["DBT_ROOT"]}/scripts/dbt_setup_constants.py').read())
 
 def error(errmsg):
     timenow = get_time("as_date")
-    frameinfo = getframeinfo(currentframe().f_back)
+    caller = sys._getframe(1)
 
     REDIFY="\033[91m"
     UNREDIFY="\033[0m"
-    print("{}ERROR: [{}] [{}:{}]: {}{}".format(REDIFY, timenow, frameinfo.filename, frameinfo.lineno, errmsg, UNREDIFY), file = sys.stderr)
+    print("{}ERROR: [{}] [{}:{}]: {}{}".format(REDIFY, timenow, caller.f_code.co_filename, caller.f_lineno, errmsg, UNREDIFY), file = sys.stderr)
     sys.exit(1)
 
+class LazyModule:
+    "Stands in for a module, which gets imported the first time one of its attributes is used"
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr):
+        if self._module is None:
+            # sh replaces itself in sys.modules while being imported, so
+            # the module is whatever import_module returns
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attr)
+
+def lazy_import(name):
+    """
+    Return a stand-in for the module NAME, which only actually gets
+    imported the first time it's used. Modules like rich take a
+    noticeable fraction of a second to import, which is wasted on runs
+    which never get to use them, e.g. "dbt-build --help". A missing
+    module is still reported straight away
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+    if importlib.util.find_spec(name) is None:
+        raise ModuleNotFoundError(f"No module named '{name}'", name=name)
+    return LazyModule(name)
+
+def current_dir():
+    """
+    Return the current directory the way the shell's pwd would, i.e.
+    through any symlinks it was reached by, without running pwd
+    """
+    currdir = os.getcwd()
+    logical_dir = os.environ.get("PWD")
+    if logical_dir and os.path.isabs(logical_dir):
+        try:
+            if os.path.samefile(logical_dir, currdir):
+                return logical_dir
+        except OSError:
+            pass
+    return currdir
+
 def find_work_area():
-    currdir=subprocess.check_output('pwd', shell=True).decode("utf-8").strip()
+    currdir=current_dir()
     while True:
         file_path = os.path.join(currdir, DBT_AREA_FILE)
 
@@ -62,11 +106,23 @@ def get_time(kind):
         timenow = datetime.datetime.now().astimezone().strftime("%a %b %-d %H:%M:%S %Z %Y")
     elif kind == "as_seconds_since_epoch":
         timenow = int(time.time())
+    elif kind == "as_filename":
+        # The date as it appears in the names of log files and directories
+        timenow = re.sub("[: ]+", "_", get_time("as_date"))
     else:
         assert False, "Unknown argument passed to get_time"
 
     return timenow
 
+@contextlib.contextmanager
+def timed_phase(timings, phase):
+    # Records how long the body of the "with" statement took, in seconds, as timings[phase]
+    starttime = time.monotonic()
+    try:
+        yield
+    finally:
+        timings[phase] = time.monotonic() - starttime
+
 def run_command(cmd):
 
     res = subprocess.Popen(cmd, shell=True, stdout=subprocess.PIPE,
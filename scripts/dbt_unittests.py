@@ -0,0 +1,237 @@
+import concurrent.futures
+import hashlib
+import json
+import os
+import re
+import subprocess
+import time
+import xml.etree.ElementTree as ET
+
+# Unit test suites that have never been timed are scheduled before the
+# ones we have durations for, since they could be arbitrarily long
+UNKNOWN_DURATION = float("inf")
+
+def find_unit_tests(builddir, pkgname):
+    """
+    Return the paths of the unit test executables of a package, i.e. all
+    executables in its "unittest" subdirectories, in a stable order
+    """
+    unittests = []
+    for dirpath, dirnames, filenames in os.walk(f"{builddir}/{pkgname}", followlinks=True):
+        dirnames[:] = sorted(d for d in dirnames if d != "CMakeFiles")
+        if os.path.basename(dirpath) != "unittest":
+            continue
+        for filename in sorted(filenames):
+            unittest_path = os.path.join(dirpath, filename)
+            if os.access(unittest_path, os.X_OK):
+                unittests.append(unittest_path)
+
+    return unittests
+
+def load_durations(durations_file):
+    try:
+        with open(durations_file) as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+def save_json(filename, data):
+    os.makedirs(os.path.dirname(filename), exist_ok=True)
+    tmpfile = f"{filename}.tmp"
+    with open(tmpfile, "w") as f:
+        json.dump(data, f, sort_keys=True, indent=4)
+    os.replace(tmpfile, filename)
+
+def file_digest(path, digests):
+    """
+    Return the sha256 of the file PATH. DIGESTS maps paths to the
+    [mtime_ns, size, digest] they had when last hashed, so a file which
+    hasn't been touched since isn't read again
+    """
+    st = os.stat(path)
+    cached = digests.get(path)
+    if cached and cached[:2] == [st.st_mtime_ns, st.st_size]:
+        return cached[2]
+
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            sha.update(chunk)
+    digests[path] = [st.st_mtime_ns, st.st_size, sha.hexdigest()]
+    return digests[path][2]
+
+def shared_library_dependencies(executable):
+    """
+    Return the shared libraries EXECUTABLE needs as (name, path) pairs,
+    as resolved by ldd in the current environment; the path is None if
+    the library isn't found
+    """
+    try:
+        output = subprocess.run(["ldd", executable], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                                universal_newlines=True).stdout
+    except OSError:
+        return []
+
+    libraries = []
+    for line in output.splitlines():
+        match = re.match(r"\s*(\S+) => (\S+)", line)
+        if match:
+            libraries.append((match.group(1), match.group(2) if match.group(2).startswith("/") else None))
+    return sorted(libraries)
+
+def suite_cache_key(suite, local_dirs, digests):
+    """
+    Return a hash of a unit test suite's executable and of the libraries
+    it loads. Libraries under one of LOCAL_DIRS (i.e. the ones built in
+    the work area) are hashed by content; any other library is only
+    identified by its path, since those come from the release
+    """
+    sha = hashlib.sha256(file_digest(suite["path"], digests).encode("utf-8"))
+    for name, path in shared_library_dependencies(suite["path"]):
+        sha.update(f"{name} => {path}\n".encode("utf-8"))
+        if path is not None and any(os.path.realpath(path).startswith(local_dir + "/") for local_dir in local_dirs):
+            sha.update(file_digest(path, digests).encode("utf-8"))
+    return sha.hexdigest()
+
+def load_results_cache(results_cache_file):
+    try:
+        with open(results_cache_file) as f:
+            cache = json.load(f)
+        return { "suites": cache.get("suites", {}), "files": cache.get("files", {}) }
+    except (OSError, ValueError, AttributeError):
+        return { "suites": {}, "files": {} }
+
+def junit_testsuites(junit_file):
+    "Return the <testsuite> elements of a JUnit XML file, or None if there's no (valid) file"
+    try:
+        root = ET.parse(junit_file).getroot()
+    except (OSError, ET.ParseError):
+        return None
+    return [root] if root.tag == "testsuite" else root.findall("testsuite")
+
+def run_unit_test(suite, timeout):
+    """
+    Run a single unit test suite, appending its output to its own log
+    file and having Boost.Test write a JUnit report to suite["junit"].
+    Returns the suite's status and how long it took to run
+    """
+    # Boost.Test only takes its logger configuration from one place, so
+    # the usual human-readable log needs to be asked for here as well
+    env = dict(os.environ)
+    env["BOOST_TEST_LOGGER"] = f"HRF,{env.get('BOOST_TEST_LOG_LEVEL', 'error')}:JUNIT,all,{suite['junit']}"
+
+    starttime = time.monotonic()
+    with open(suite["log"], "ab") as logfile:
+        logfile.write(f"Start of unit test suite {suite['name']}\n".encode("utf-8"))
+        logfile.flush()
+        try:
+            returncode = subprocess.run([suite["path"]], stdout=logfile, stderr=subprocess.STDOUT,
+                                        stdin=subprocess.DEVNULL, timeout=timeout, env=env).returncode
+        except subprocess.TimeoutExpired:
+            logfile.write(f"\nUnit test suite {suite['name']} killed after exceeding its {timeout} second timeout\n".encode("utf-8"))
+            return "TIMEOUT", time.monotonic() - starttime
+
+    duration = time.monotonic() - starttime
+
+    testsuites = junit_testsuites(suite["junit"])
+    if testsuites is not None:
+        num_failed = sum(int(testsuite.get("failures", 0)) + int(testsuite.get("errors", 0)) for testsuite in testsuites)
+        return "SUCCESS" if num_failed == 0 and returncode == 0 else "FAILURE", duration
+
+    # Not a Boost.Test executable, or one too old to write JUnit reports
+    with open(suite["log"], "r", errors="replace") as logfile:
+        for line in logfile:
+            if "*** No errors detected" in line:
+                return "SUCCESS", duration
+    return "FAILURE", duration
+
+def run_unit_tests(suites, n_jobs, timeout=None, durations_file=None, report=print,
+                   results_cache_file=None, local_dirs=(), use_cached_results=True):
+    """
+    Run unit test suites concurrently on a pool of N_JOBS workers.
+
+    SUITES is a list of dicts with the keys "name", "path", "relpath",
+    "log" and "junit". If DURATIONS_FILE is given, the suites which took
+    longest in earlier runs are started first, and the file is updated
+    with the durations seen in this run. REPORT is called with each
+    suite and its status as the suite finishes.
+
+    If RESULTS_CACHE_FILE is given, suites which passed are recorded in
+    it along with suite_cache_key(suite, LOCAL_DIRS), and as long as
+    that key stays the same and USE_CACHED_RESULTS is true they aren't
+    run again but reported as "SUCCESS (cached)".
+
+    Returns a dict mapping each suite's relpath to its status
+    """
+    durations = load_durations(durations_file) if durations_file else {}
+    cache = load_results_cache(results_cache_file) if results_cache_file else None
+
+    def run(suite):
+        key = None
+        if cache is not None:
+            try:
+                key = suite_cache_key(suite, local_dirs, cache["files"])
+            except OSError:
+                pass
+            cached = cache["suites"].get(suite["relpath"])
+            if use_cached_results and key is not None and cached and cached["key"] == key:
+                return "SUCCESS (cached)", None, key
+        status, duration = run_unit_test(suite, timeout)
+        return status, duration, key
+
+    schedule = sorted(suites, key=lambda suite: durations.get(suite["relpath"], UNKNOWN_DURATION), reverse=True)
+
+    results = {}
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, n_jobs)) as executor:
+        futures = {executor.submit(run, suite): suite for suite in schedule}
+        for future in concurrent.futures.as_completed(futures):
+            suite = futures[future]
+            status, duration, key = future.result()
+            results[suite["relpath"]] = status
+            if duration is not None:
+                durations[suite["relpath"]] = round(duration, 3)
+            if cache is not None and status == "SUCCESS" and key is not None:
+                cache["suites"][suite["relpath"]] = { "key": key, "time": time.strftime("%Y-%m-%d %H:%M:%S") }
+            elif cache is not None and status != "SUCCESS (cached)":
+                cache["suites"].pop(suite["relpath"], None)
+            report(suite, status)
+
+    if durations_file:
+        save_json(durations_file, durations)
+    if cache is not None:
+        save_json(results_cache_file, cache)
+
+    return results
+
+def write_junit_report(suites, results, junit_file):
+    """
+    Combine the JUnit reports of unit test suites run by run_unit_tests
+    into JUNIT_FILE. Suites without a report of their own (cached ones,
+    ones which timed out and ones not using Boost.Test) are represented
+    by a single test case carrying their status
+    """
+    root = ET.Element("testsuites")
+    for suite in suites:
+        status = results[suite["relpath"]]
+        suite_name = f"{suite['package']}/{suite['name']}"
+
+        testsuites = junit_testsuites(suite["junit"]) if status in ["SUCCESS", "FAILURE"] else None
+        if testsuites:
+            for testsuite in testsuites:
+                testsuite.set("name", suite_name if len(testsuites) == 1 else f"{suite_name}/{testsuite.get('name')}")
+                root.append(testsuite)
+            continue
+
+        testsuite = ET.SubElement(root, "testsuite", name=suite_name, tests="1",
+                                  failures="1" if status == "FAILURE" else "0",
+                                  errors="1" if status == "TIMEOUT" else "0", skipped="0")
+        testcase = ET.SubElement(testsuite, "testcase", name=suite["name"], classname=suite_name)
+        if not status.startswith("SUCCESS"):
+            ET.SubElement(testcase, "failure" if status == "FAILURE" else "error", message=status).text = f"See {suite['log']}"
+        else:
+            ET.SubElement(testcase, "system-out").text = status
+
+    for attribute in ["tests", "failures", "errors", "skipped"]:
+        root.set(attribute, str(sum(int(testsuite.get(attribute, 0)) for testsuite in root)))
+
+    ET.ElementTree(root).write(junit_file, encoding="utf-8", xml_declaration=True)
@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+
+import os
+DBT_ROOT=os.environ["DBT_ROOT"]
+
+import argparse
+import errno
+import fcntl
+import hashlib
+import logging
+import shutil
+import sys
+import time
+
+sys.path.append(f'{DBT_ROOT}/bin')
+sys.path.append(f'{DBT_ROOT}/scripts')
+
+import clonevirtualenv
+from dbt_setup_tools import error
+
+DEFAULT_CACHE_DIR = os.path.join(os.environ.get("XDG_CACHE_HOME", os.path.expanduser("~/.cache")), "dbt", "venvs")
+DEFAULT_MAX_SIZE = "20G"
+
+# Written into an entry once its venv is complete; its mtime is when
+# the entry was last used
+READY_MARKER = "ready"
+SIZE_FILE = "size"
+
+usage_blurb=f"""
+Usage
+-----
+
+    {os.path.basename(__file__)} [-v] [-t <tarball>] [-r <requirements file>] <release> <release venv> <new venv>
+
+Creates <new venv> as a clone of <release venv> via a cache of prepared
+venvs shared by all work areas, so the release's venv is only copied
+once per release and set of requirements.
+
+The cache is in $DBT_VENV_CACHE_DIR (default {DEFAULT_CACHE_DIR});
+once it's bigger than $DBT_VENV_CACHE_SIZE (default {DEFAULT_MAX_SIZE}) the
+least recently used venvs are removed from it.
+"""
+
+def parse_size(size):
+    "Turn a size like 500M or 20G into bytes"
+    units = { "K": 1 << 10, "M": 1 << 20, "G": 1 << 30, "T": 1 << 40 }
+    size = size.strip().upper().rstrip("B")
+    if size and size[-1] in units:
+        return int(float(size[:-1]) * units[size[-1]])
+    return int(size)
+
+def cache_key(src_dir, requirements=None):
+    """
+    Identify a release venv by where it is, when its pyvenv.cfg was last
+    written (nightlies get rebuilt in place) and what it was built from
+    """
+    hasher = hashlib.sha256()
+    hasher.update(os.path.realpath(src_dir).encode("utf-8"))
+    cfg = os.path.join(src_dir, "pyvenv.cfg")
+    if os.path.exists(cfg):
+        hasher.update(str(os.stat(cfg).st_mtime_ns).encode("utf-8"))
+        with open(cfg, "rb") as f:
+            hasher.update(f.read())
+    if requirements and os.path.exists(requirements):
+        with open(requirements, "rb") as f:
+            hasher.update(f.read())
+    return hasher.hexdigest()[:16]
+
+def disk_usage(path):
+    "Bytes taken up by the tree under PATH, counting hardlinked files once"
+    seen = set()
+    total = 0
+    for dirpath, dirnames, filenames in os.walk(path):
+        for name in dirnames + filenames:
+            st = os.lstat(os.path.join(dirpath, name))
+            if (st.st_dev, st.st_ino) in seen:
+                continue
+            seen.add((st.st_dev, st.st_ino))
+            total += st.st_blocks * 512
+    return total
+
+def reflinks_work(src_dir, dst_dir):
+    "Whether files can be reflinked from SRC_DIR's filesystem to DST_DIR's"
+    probe_src = os.path.join(src_dir, f".reflink-probe-{os.getpid()}")
+    probe_dst = os.path.join(dst_dir, f".reflink-probe-{os.getpid()}")
+    try:
+        with open(probe_src, "wb") as f:
+            f.write(b"probe")
+        with open(probe_src, "rb") as fsrc, open(probe_dst, "wb") as fdst:
+            fcntl.ioctl(fdst.fileno(), clonevirtualenv.FICLONE, fsrc.fileno())
+        return True
+    except OSError:
+        return False
+    finally:
+        for probe in [probe_src, probe_dst]:
+            if os.path.exists(probe):
+                os.remove(probe)
+
+def prepare_entry(entry, src_dir, tarball):
+    "Fill the cache entry ENTRY with a clone of SRC_DIR, if it isn't already"
+    if os.path.exists(os.path.join(entry, READY_MARKER)):
+        return
+
+    if os.path.exists(entry):
+        logging.info(f"removing incomplete cached venv {entry}")
+        shutil.rmtree(entry)
+    os.makedirs(entry)
+
+    logging.info(f"adding {src_dir} to the venv cache")
+    # The image is a clone of its own, so its paths already point into
+    # the cache and get rewritten when a work area is cloned from it
+    clonevirtualenv.clone_virtualenv(src_dir, os.path.join(entry, "venv"), tarball)
+    with open(os.path.join(entry, SIZE_FILE), "w") as f:
+        f.write(str(disk_usage(entry)))
+    open(os.path.join(entry, READY_MARKER), "w").close()
+
+def lock_is_current(lock, lockfile):
+    """
+    Whether LOCK, an open lock file, is still the file at LOCKFILE, i.e.
+    the entry wasn't evicted, lock file and all, while we waited for it
+    """
+    try:
+        st = os.stat(lockfile)
+    except FileNotFoundError:
+        return False
+    fst = os.fstat(lock.fileno())
+    return (st.st_dev, st.st_ino) == (fst.st_dev, fst.st_ino)
+
+def evict(cache_dir, max_size, keep):
+    """
+    Remove the least recently used venvs from the cache until it's no
+    bigger than MAX_SIZE bytes, leaving alone KEEP and any venv another
+    process is using
+    """
+    entries = []
+    for release in os.listdir(cache_dir):
+        releasedir = os.path.join(cache_dir, release)
+        if not os.path.isdir(releasedir):
+            continue
+        for key in os.listdir(releasedir):
+            entry = os.path.join(releasedir, key)
+            marker = os.path.join(entry, READY_MARKER)
+            if not os.path.isdir(entry) or not os.path.exists(marker):
+                continue
+            try:
+                with open(os.path.join(entry, SIZE_FILE)) as f:
+                    size = int(f.read())
+            except (OSError, ValueError):
+                size = disk_usage(entry)
+            entries.append((os.stat(marker).st_mtime, size, entry))
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, entry in sorted(entries):
+        if total <= max_size:
+            break
+        if entry == keep:
+            continue
+        lockfile = f"{entry}.lock"
+        with open(lockfile, "a") as lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError as e:
+                if e.errno in (errno.EAGAIN, errno.EACCES):
+                    continue
+                raise
+            if not lock_is_current(lock, lockfile) or not os.path.isdir(entry):
+                continue
+            logging.info(f"removing least recently used cached venv {entry} ({size / 1e9:.1f} GB)")
+            shutil.rmtree(entry)
+            # Still holding the lock, so anyone waiting on this lock file
+            # finds it gone once they get it, and starts over
+            os.unlink(lockfile)
+            total -= size
+
+def clone_from_cache(release, src_dir, dst_dir, tarball=None, requirements=None,
+                     cache_dir=DEFAULT_CACHE_DIR, max_size=parse_size(DEFAULT_MAX_SIZE)):
+    """
+    Clone the release venv SRC_DIR to DST_DIR by way of the cache,
+    adding it to the cache first if it's not in there yet
+    """
+    entry = os.path.join(cache_dir, release, cache_key(src_dir, requirements))
+    os.makedirs(os.path.dirname(entry), exist_ok=True)
+
+    # Whoever holds an entry's lock exclusively is creating or removing
+    # it; cloning from it only needs it not to change underneath
+    lockfile = f"{entry}.lock"
+    while True:
+        lock = open(lockfile, "a")
+        fcntl.flock(lock, fcntl.LOCK_SH)
+        if lock_is_current(lock, lockfile) and os.path.exists(os.path.join(entry, READY_MARKER)):
+            break
+        fcntl.flock(lock, fcntl.LOCK_UN)
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        if lock_is_current(lock, lockfile):
+            prepare_entry(entry, src_dir, tarball)
+        # Could be evicted between releasing the lock and getting it
+        # back, hence the loop
+        lock.close()
+
+    with lock:
+        os.utime(os.path.join(entry, READY_MARKER))
+
+        # Reflinks share nothing once either copy is written to; where
+        # they aren't available hardlinks still save the copy, and pip
+        # replaces rather than rewrites the files it upgrades
+        image = os.path.join(entry, "venv")
+        hardlink = not reflinks_work(entry, os.path.dirname(dst_dir))
+        starttime = time.monotonic()
+        clonevirtualenv.clone_virtualenv(image, dst_dir, None, hardlink=hardlink)
+        logging.info(f"cloned cached venv {image} in {time.monotonic() - starttime:.1f} s")
+
+    evict(cache_dir, max_size, keep=entry)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(usage=usage_blurb)
+    parser.add_argument("-v", "--verbose", action="store_true", dest="verbose", help=argparse.SUPPRESS)
+    parser.add_argument("-t", "--tarball", action="store", dest="tarball", help=argparse.SUPPRESS)
+    parser.add_argument("-r", "--requirements", action="store", dest="requirements", help=argparse.SUPPRESS)
+    parser.add_argument("release", help=argparse.SUPPRESS)
+    parser.add_argument("src_dir", help=argparse.SUPPRESS)
+    parser.add_argument("dst_dir", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING, format="%(message)s")
+
+    try:
+        max_size = parse_size(os.environ.get("DBT_VENV_CACHE_SIZE", DEFAULT_MAX_SIZE))
+    except ValueError:
+        error(f"Unable to make sense of DBT_VENV_CACHE_SIZE=\"{os.environ['DBT_VENV_CACHE_SIZE']}\"; it should be e.g. 500M or 20G. Exiting...")
+
+    src_dir = os.path.realpath(args.src_dir)
+    dst_dir = os.path.realpath(args.dst_dir)
+    if not os.path.isdir(src_dir):
+        error(f"Release venv {src_dir} doesn't exist. Exiting...")
+    if os.path.exists(dst_dir):
+        error(f"{dst_dir} already exists. Exiting...")
+
+    clone_from_cache(args.release, src_dir, dst_dir, tarball=args.tarball, requirements=args.requirements,
+                     cache_dir=os.environ.get("DBT_VENV_CACHE_DIR", DEFAULT_CACHE_DIR), max_size=max_size)
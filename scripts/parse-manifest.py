@@ -1,10 +1,19 @@
 #!/usr/bin/env python3
 
 import os
+import re
 import sys
+import json
+import time
 import yaml
+import hashlib
+import shutil
 import argparse
 import subprocess
+import collections
+import concurrent.futures
+
+from dbt_release_data import YamlLoader, _survives_json, _write_json
 
 
 def get_field(fman, fkey):
@@ -22,54 +31,109 @@ def parse_manifest_file(fname):
     fman = ""
     with open(fname, 'r') as stream:
         try:
-            fman = yaml.safe_load(stream)
+            fman = yaml.load(stream, Loader=YamlLoader)
         except yaml.YAMLError as exc:
             print(exc)
     return fman
 
 
 def merge_dict(y1, y2):
+    """Merge y2 into y1; lists are concatenated, and nothing from y2 is
+    put into y1 without being copied, so merging further files into y1
+    never changes y2"""
     for key, value in y2.items():
-        if key in y1:
-            if value is None:
-                continue
-            elif type(value) is dict:
-                merge_dict(y1[key], y2[key])
-            elif type(value) is list:
-                y1[key].extend(y2[key])
+        if key in y1 and value is None:
+            continue
+        elif type(value) is dict:
+            if type(y1.get(key)) is not dict:
+                y1[key] = {}
+            merge_dict(y1[key], value)
+        elif type(value) is list:
+            if key in y1 and y1[key] is not None:
+                y1[key] = y1[key] + value
             else:
-                y1[key] = y2[key]
+                y1[key] = list(value)
         else:
-            y1[key] = y2[key]
+            y1[key] = value
     return
 
 
 def merge_dict_list(listd):
-    if listd is None:
-        return
-    tags = list(listd[0].keys())
-    mlistd = [[] for x in tags]
+    """Collapse entries with the same name (or whatever their first field
+    is) into one, in the position of the first of them; fields of later
+    entries take precedence"""
+    if not listd:
+        return listd
+    tag = "name" if "name" in listd[0] else next(iter(listd[0]))
+    merged = collections.OrderedDict()
     for i in listd:
-        if i[tags[0]] not in mlistd[0]:
-            for j in range(len(tags)):
-                mlistd[j].append(i[tags[j]])
+        if i[tag] in merged:
+            merged[i[tag]].update(i)
         else:
-            idx = mlistd[0].index(i[tags[0]])
-            for j in range(1, len(tags)):
-                mlistd[j][idx] = i[tags[j]]
-    listd = [ {tags[k]:mlistd[k][i] for k in range(len(tags))} \
-        for i in range(len(mlistd[0])) ]
-    return listd
+            merged[i[tag]] = dict(i)
+    return list(merged.values())
 
 
-def merge_manifest_files(fnames):
-    """Merge dictionaries in the list, elements with higher index take
-    precedence; fnames looks like [running, develop, user]"""
+def merge_manifest_files_uncached(fnames):
     fman = {}
     for i in fnames:
         merge_dict(fman, parse_manifest_file(i))
     for i in ["external_deps", "src_pkgs", "prebuilt_pkgs"]:
-        fman[i] = merge_dict_list(fman[i])
+        fman[i] = merge_dict_list(fman.get(i))
+
+    return fman
+
+
+def file_sha256(fname):
+    with open(fname, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def merge_manifest_files(fnames, cache_dir=None):
+    """Merge dictionaries in the list, elements with higher index take
+    precedence; fnames looks like [running, develop, user]
+
+    If cache_dir is given, the result is kept there and reused for as
+    long as the files haven't changed: either their mtimes and sizes
+    are the same as when the result was cached, or their contents."""
+    if cache_dir is None:
+        return merge_manifest_files_uncached(fnames)
+
+    for i in fnames:
+        if not os.path.exists(i):
+            print("Error: -- Manifest file {} does not exist".format(i))
+            exit(20)
+
+    paths = [os.path.realpath(i) for i in fnames]
+    cache_file = os.path.join(cache_dir, "manifest-{}.json".format(
+        hashlib.sha256("\0".join(paths).encode("utf-8")).hexdigest()[:16]))
+
+    stats = [os.stat(i) for i in paths]
+    try:
+        with open(cache_file) as f:
+            cached = json.load(f)
+        files = cached["files"]
+        if all(j["mtime_ns"] == st.st_mtime_ns and j["size"] == st.st_size
+               for j, st in zip(files, stats)) and len(files) == len(paths):
+            return cached["manifest"]
+        if len(files) == len(paths) and all(j["sha256"] == file_sha256(i)
+                                            for j, i in zip(files, paths)):
+            fman = cached["manifest"]
+        else:
+            fman = None
+    except (OSError, ValueError, KeyError, TypeError):
+        fman = None
+
+    if fman is None:
+        fman = merge_manifest_files_uncached(fnames)
+
+    files = [{"path": i, "mtime_ns": st.st_mtime_ns, "size": st.st_size,
+              "sha256": file_sha256(i)} for i, st in zip(paths, stats)]
+    # A manifest JSON would change (e.g. maps with integer keys) or can't
+    # represent at all just isn't cached, and neither is anything in a
+    # read-only cache directory
+    if _survives_json(fman):
+        _write_json(cache_file, {"files": files, "manifest": fman})
 
     return fman
 
@@ -121,13 +185,82 @@ def check_output(cmd):
     return out
 
 
-def run_git_checkout(fman, srcdir):
+def run_git(args, cwd=None):
+    # Never wait on a password prompt, which would hang a worker for good
+    env = dict(os.environ, GIT_TERMINAL_PROMPT="0")
+    irun = subprocess.run(["git"] + args, cwd=cwd, env=env,
+                          stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    return irun.returncode, irun.stdout.decode("utf-8", errors="replace")
+
+
+def checkout_repo(pkg, srcdir, depth=None, reference_dir=None, partial=False):
+    """Clone a src_pkgs entry into srcdir and check out its tag; returns a
+    dict with the outcome, how long it took and git's output"""
+    start = time.monotonic()
+    dest = os.path.join(srcdir, pkg["name"])
+    result = {"name": pkg["name"], "tag": pkg["tag"], "ok": False, "output": ""}
+
+    if os.path.exists(dest):
+        result["output"] = "{} already exists".format(dest)
+        result["seconds"] = time.monotonic() - start
+        return result
+
+    clone_args = ["clone", "--quiet"]
+    if reference_dir is not None:
+        for mirror in [pkg["name"] + ".git", pkg["name"]]:
+            if os.path.isdir(os.path.join(reference_dir, mirror)):
+                clone_args += ["--reference-if-able", os.path.join(reference_dir, mirror)]
+                break
+    if partial:
+        clone_args += ["--filter=blob:none"]
+
+    # Cloning straight at the tag is what makes a shallow clone possible;
+    # it only works for tags and branches though, not for commit hashes
+    rc, out = 1, ""
+    if not re.fullmatch(r"[0-9a-f]{7,40}", str(pkg["tag"])):
+        shallow_args = ["--depth", str(depth)] if depth else []
+        rc, out = run_git(clone_args + shallow_args + ["--branch", str(pkg["tag"]), pkg["repo"], dest])
+    if rc != 0:
+        shutil.rmtree(dest, ignore_errors=True)
+        rc, out = run_git(clone_args + [pkg["repo"], dest])
+        if rc == 0:
+            rc, out2 = run_git(["checkout", "--quiet", str(pkg["tag"])], cwd=dest)
+            out += out2
+
+    result["ok"] = rc == 0
+    result["output"] = out.strip()
+    result["seconds"] = time.monotonic() - start
+    return result
+
+
+def run_git_checkout(fman, srcdir, jobs=8, depth=None, reference_dir=None, partial=False):
+    """Check out all of the src_pkgs on a pool of jobs workers, then report
+    how long each took and every failure together"""
     git_repos = fman["src_pkgs"]
-    for i in git_repos:
-        icmd = "mkdir -p {} && cd {} && git clone {} && cd {} && git checkout {} && cd ..;".format(
-                srcdir, srcdir, i["repo"], i["name"], i["tag"])
-        iout = check_output(icmd)
-        print("Info[Git Checkout]: -- {}".format(iout))
+    os.makedirs(srcdir, exist_ok=True)
+    start = time.monotonic()
+
+    results = []
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, jobs)) as executor:
+        futures = [executor.submit(checkout_repo, i, srcdir, depth, reference_dir, partial)
+                   for i in git_repos]
+        for future in concurrent.futures.as_completed(futures):
+            result = future.result()
+            results.append(result)
+            print("Info[Git Checkout]: -- {} {} ({}) in {:.1f} s".format(
+                "checked out" if result["ok"] else "FAILED to check out",
+                result["name"], result["tag"], result["seconds"]), flush=True)
+
+    failures = [i for i in results if not i["ok"]]
+    print("Info[Git Checkout]: -- {} of {} repos checked out in {:.1f} s; slowest:".format(
+          len(results) - len(failures), len(results), time.monotonic() - start))
+    for i in sorted(results, key=lambda x: x["seconds"], reverse=True)[:5]:
+        print("    {:8.1f} s  {}".format(i["seconds"], i["name"]))
+
+    if failures:
+        for i in failures:
+            print('Error: checking out {} at {} failed:\n{}'.format(i["name"], i["tag"], i["output"]))
+        exit(10)
     return
 
 
@@ -149,6 +282,18 @@ if __name__ == "__main__":
     parser.add_argument('--git-checkout', action='store_true',
             help='''Run git clone and checkout commands for DAQ source packages
             from GitHub repos;''')
+    parser.add_argument('-j', '--jobs', type=int, default=8,
+            help="number of repos to clone at once;")
+    parser.add_argument('--depth', type=int, default=None,
+            help='''make shallow clones with this many commits of history at
+            the requested tag;''')
+    parser.add_argument('--partial', action='store_true',
+            help='''make partial clones, which download file contents only as
+            they're needed;''')
+    parser.add_argument('--reference-dir', default=None,
+            help='''directory of local mirrors (<name>.git or <name>) to borrow
+            objects from via git's alternates, which the clones then depend
+            on;''')
     parser.add_argument('-s', '--src-dir', default='./sourcecode',
             help="source code directory;")
     parser.add_argument('-r', '--release', default='develop',
@@ -158,6 +303,12 @@ if __name__ == "__main__":
     parser.add_argument('-u', '--users-manifest',
             default=None,
             help="set the path to user's manifest files;")
+    parser.add_argument('--cache-dir',
+            default=os.path.join(os.environ.get("XDG_CACHE_HOME",
+                os.path.expanduser("~/.cache")), "dbt", "manifests"),
+            help='''directory to cache the merged manifests in;''')
+    parser.add_argument('--no-cache', action='store_true',
+            help='''always parse and merge the manifest files;''')
 
     args = parser.parse_args()
 
@@ -173,7 +324,8 @@ if __name__ == "__main__":
     fnames = [release_manifest]
     if user_manifest is not None:
         fnames.append(user_manifest)
-    fman = merge_manifest_files(fnames)
+    fman = merge_manifest_files(fnames,
+            cache_dir=None if args.no_cache else args.cache_dir)
     #print(fman)
     #print(yaml.dump(fman, default_flow_style=False, sort_keys=False))
 
@@ -184,4 +336,5 @@ if __name__ == "__main__":
     if args.setup_prebuilt:
         cmd_products_setup(fman, "prebuilt_pkgs")
     if args.git_checkout:
-        run_git_checkout(fman, args.src_dir)
+        run_git_checkout(fman, args.src_dir, jobs=args.jobs, depth=args.depth,
+                         reference_dir=args.reference_dir, partial=args.partial)
@@ -1,16 +1,146 @@
 #!/usr/bin/env python
 
+import os
+import selectors
+import shutil
+import sys
+
 import pexpect
 import click
-import shutil
 
-def run(cmd, args, log):
+# How much of the command's output is read from the pty at a time, and
+# how much of it is buffered before it's written to the log file
+READ_CHUNK_SIZE = 65536
+LOG_BUFFER_SIZE = 1048576
+
+# How long to wait for new output before letting the user know that
+# the command is still running
+SILENCE_TIMEOUT = 60
+
+
+class LineEndingNormalizer:
+    """
+    Turn the "\\r\\n" line endings a pty produces into "\\n", and the
+    lone "\\r" of progress lines (ninja's "[12/345] Building..." etc.)
+    into line breaks, so they don't overwrite each other in a file.
+    A "\\r" at the start of a line doesn't produce an empty line.
+    """
+
+    def __init__(self):
+        self.pending_cr = False
+        self.at_line_start = True
+
+    def feed(self, data):
+        if self.pending_cr:
+            data = b"\r" + data
+            self.pending_cr = False
+
+        # A "\r" at the end of the chunk may be the first half of a "\r\n"
+        if data.endswith(b"\r"):
+            data = data[:-1]
+            self.pending_cr = True
+
+        data = data.replace(b"\r\n", b"\n")
+
+        if b"\r" in data:
+            data = self._break_progress_lines(data)
+
+        if data:
+            self.at_line_start = data.endswith(b"\n")
+
+        return data
+
+    def flush(self):
+        if self.pending_cr:
+            self.pending_cr = False
+            if not self.at_line_start:
+                self.at_line_start = True
+                return b"\n"
+        return b""
+
+    def _break_progress_lines(self, data):
+        at_line_start = self.at_line_start
+        pieces = []
+        segments = data.split(b"\r")
+        for i, segment in enumerate(segments):
+            if segment:
+                pieces.append(segment)
+                at_line_start = segment.endswith(b"\n")
+            if i < len(segments) - 1 and not at_line_start:
+                pieces.append(b"\n")
+                at_line_start = True
+        return b"".join(pieces)
+
+
+def tee(fd, logfile, terminal, watcher=None):
+    """
+    Copy everything that can be read from FD to the binary streams
+    LOGFILE (if not None) and TERMINAL until FD reaches end-of-file.
+    The bytes go to the terminal untouched if it's a tty, otherwise
+    their line endings are normalized the same way as in the log.
+
+    If WATCHER is given, its feed() method is called with everything
+    written to the log along with the offset in the log it was written
+    at, and its flush() method is called at the end.
+    """
+
+    raw_terminal = terminal.isatty()
+    normalizer = LineEndingNormalizer()
+    log_offset = logfile.tell() if logfile else 0
+
+    with selectors.DefaultSelector() as selector:
+        selector.register(fd, selectors.EVENT_READ)
+
+        while True:
+            if not selector.select(timeout=SILENCE_TIMEOUT):
+                terminal.write(b"<pytee: %d sec elapsed without new input>\n" % SILENCE_TIMEOUT)
+                terminal.flush()
+                continue
+
+            try:
+                data = os.read(fd, READ_CHUNK_SIZE)
+            except OSError:  # On Linux, reading from a pty whose other end is closed yields EIO
+                data = b""
+
+            if not data:
+                break
+
+            if raw_terminal:
+                terminal.write(data)
+                terminal.flush()
+
+            if logfile or not raw_terminal:
+                text = normalizer.feed(data)
+                if logfile:
+                    logfile.write(text)
+                    if watcher:
+                        watcher.feed(text, log_offset)
+                    log_offset += len(text)
+                if not raw_terminal:
+                    terminal.write(text)
+                    terminal.flush()
+
+    text = normalizer.flush()
+    if logfile:
+        logfile.write(text)
+        if watcher:
+            watcher.feed(text, log_offset)
+            watcher.flush()
+    if not raw_terminal:
+        terminal.write(text)
+        terminal.flush()
+
+
+def run(cmd, args, log, watcher=None):
     """
     Execute CMD with argument ARGS in a subshell with pty.
-    
-    CMD: The command.  
+
+    CMD: The command.
 
     ARGS: The command arguments.
+
+    WATCHER: Optional object which is fed the output as it's written to
+    the log (see tee()).
     """
     # print(cmd, args, log)
 
@@ -19,49 +149,33 @@ def run(cmd, args, log):
 
     logfile = None
     if log:
-        logfile = open(log,'a')
-
+        logfile = open(log, 'ab', buffering=LOG_BUFFER_SIZE)
 
     cols, rows = shutil.get_terminal_size(fallback=(400, 100))
 
+    # Anything already printed by the caller needs to appear before the command's output
+    sys.stdout.flush()
+
     process = pexpect.spawn(
         f'{cmd} {" ".join(args)}',
         dimensions=(rows, cols)
     )
 
-    patterns = process.compile_pattern_list([
-            '\r\n',
-            '\r',
-            pexpect.TIMEOUT,
-            pexpect.EOF,
-        ])
-
-    while True:
-        index = process.expect (patterns, timeout=60)
-
-        # Newline
-        if index == 0:
-            text=process.before.decode('utf-8')
-            print(text,flush=True)
-            if log:
-                print(text, file=logfile)
-
-        # Carriage return
-        elif index == 1:
-            if not process.before:
-                continue
-            text=process.before.decode('utf-8')
-            print(text,flush=True)
-            if log:
-                print(text, file=logfile)
-        # Timeout
-        elif index == 2:
-            print('<pytee: 60 sec elapsed without new input>')
-            continue
-        else:
-            break
+    try:
+        tee(process.child_fd, logfile, sys.stdout.buffer, watcher)
+    except BaseException:
+        process.close(force=True)
+        raise
+    finally:
+        if logfile:
+            logfile.close()
+
+    # All the output's been read, so the child can be reaped without
+    # the delay close() would otherwise add
+    process.wait()
+    process.ptyproc.delayafterclose = 0
     process.close()
-    
+
     # print(process.exitstatus, process.signalstatus)
     #raise SystemExit(process.exitstatus)
     return process.exitstatus
@@ -73,6 +187,6 @@ def run(cmd, args, log):
 @click.option('-l', '--log', type=click.Path(), help='Log file.')
 def run_cli(cmd, args, log):
     run(cmd, args, log)
-    
+
 if __name__ == '__main__':
     run_cli()